@@ -0,0 +1,63 @@
+"""
+Accuracy of larger time steps on SiouxFalls
+
+Compares trip time statistics of simulations with delta_t of 30 s and 60 s (with and without multi-edge
+movement) against the reference simulation with delta_t = 10 s and one edge per step.
+The demand realizations differ between time steps, so the statistics are averaged over several seeds.
+
+Run `python accuracy_report.py`, the report is saved to results/accuracy_report.csv
+"""
+import time
+
+import pandas as pd
+
+from simulation import Simulation
+
+configurations = [(10, False),  # reference
+                  (10, True),
+                  (30, False),
+                  (30, True),
+                  (60, False),
+                  (60, True)]
+
+seeds = [1729, 1730, 1731]
+
+
+def run_configuration(delta_t, multi_edge, seed, demand_scenario='baseline'):
+    sim = Simulation(demand_scenario=demand_scenario, eps=0.1, seed=seed, delta_t=delta_t, multi_edge=multi_edge)
+    sim.progress_bar = False
+    sim.plot_log = False
+
+    start = time.time()
+    sim.run()
+    wall_time = time.time() - start
+
+    stat_df = sim._compute_car_stats_df()
+    return {'delta_t': delta_t,
+            'multi_edge': multi_edge,
+            'seed': seed,
+            'steps': len(sim.run_log.records['t']),
+            'wall_time': wall_time,
+            'num_trips': stat_df.shape[0],
+            'tt': stat_df['tt'].mean(),
+            'tt_p50': stat_df['tt'].quantile(0.5),
+            'tt_p90': stat_df['tt'].quantile(0.9),
+            'dp_tt': stat_df['dp_tt'].mean(),
+            'dp_induced_excess_tt': stat_df['dp_induced_excess_tt'].mean(),
+            'tt_est_error': stat_df['tt_est_error'].mean()}
+
+
+if __name__ == '__main__':
+
+    rows = [run_configuration(delta_t, multi_edge, seed)
+            for delta_t, multi_edge in configurations for seed in seeds]
+    report = pd.DataFrame(rows).drop(columns='seed').groupby(['delta_t', 'multi_edge'], sort=False).mean()
+
+    # relative error of the mean travel time with respect to the reference
+    reference = report.iloc[0]
+    report['tt_rel_error_percent'] = 100 * (report['tt'] - reference['tt']) / reference['tt']
+    report['dp_tt_rel_error_percent'] = 100 * (report['dp_tt'] - reference['dp_tt']) / reference['dp_tt']
+
+    pd.set_option('display.width', 200)
+    print(report)
+    report.to_csv('results/accuracy_report.csv')
@@ -0,0 +1,86 @@
+"""
+Trajectory of the non-private network, shared by all epsilon values
+
+The non-private network only depends on the demand scenario, the capacity scenario, the seed and the network data.
+Its completed trips and run log are saved once with the configuration that produced them, and replayed by every
+simulation with another epsilon and the same configuration.
+"""
+import json
+import os
+
+import numpy as np
+
+from fleet import Fleet
+from run_log import RunLog
+
+
+class BaselineTrajectory:
+
+    def __init__(self):
+
+        self.records = {c: [] for c in RunLog.counters}  # per-step counters of the run log
+        self.utilization = []  # per-step edge utilization
+        self.num_steps = None  # steps until the max_time is reached and all cars arrived
+        self.fleet = None  # completed trips
+        self.trip_chunks = []  # completed trips of the recorded run
+        self.cars_generated = 0
+
+    def append(self, log_t):
+        for c in RunLog.counters:
+            self.records[c].append(log_t[c])
+        self.utilization.append(log_t['edge_utilization'])
+        return None
+
+    def add_trips(self, chunks):
+        self.trip_chunks.extend(chunks)
+        return None
+
+    def log(self, t):
+        log_t = {c: self.records[c][t] for c in RunLog.counters}
+        log_t['edge_utilization'] = self.utilization[t]
+        return log_t
+
+    def save(self, path, fleet=None, config=None, cars_generated=None, num_steps=None):
+        trips = {f: np.concatenate([c[f] for c in self.trip_chunks] + [v[:0]]) for f, v in fleet.state.items()}
+        arrays = {'trip_' + f: v for f, v in trips.items()}
+        arrays.update({c: np.asarray(self.records[c][:num_steps]) for c in RunLog.counters})
+        arrays['utilization'] = np.vstack(self.utilization[:num_steps])
+        arrays['path_edges'] = fleet.path_edges
+        arrays['cars_generated'] = cars_generated
+        arrays['num_steps'] = num_steps
+        arrays['config'] = json.dumps(config, sort_keys=True)
+
+        # write to a temporary file first so that concurrent simulations never read a partial file
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = path + '.%d.tmp' % os.getpid()
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, **arrays)
+        os.replace(tmp_path, path)
+
+        return None
+
+    @classmethod
+    def load(cls, path, config=None):
+        """
+        Return the saved trajectory, or None if it does not exist or was recorded with another configuration
+        """
+        if not os.path.exists(path):
+            return None
+
+        baseline = cls()
+        with np.load(path) as data:
+            if 'config' not in data.files or str(data['config']) != json.dumps(config, sort_keys=True):
+                print('[Simulation] The trajectory %s was recorded with another configuration, recording it again'
+                      % path)
+                return None
+            baseline.num_steps = int(data['num_steps'])
+            baseline.cars_generated = int(data['cars_generated'])
+            baseline.records = {c: data[c].tolist() for c in RunLog.counters}
+            utilization = data['utilization']
+            baseline.utilization = [utilization[t:t + 1] for t in range(baseline.num_steps)]
+
+            baseline.fleet = Fleet()
+            baseline.fleet.path_edges = data['path_edges']
+            baseline.fleet.completed_chunks = [{f: data['trip_' + f] for f in baseline.fleet.state}]
+
+        return baseline
@@ -0,0 +1,332 @@
+"""
+Benchmarks of the simulation hot paths
+
+Times the latency function, the routing tables, routing queries, car generation, fleet movement, the DP latency
+update, the run log and the trip statistics on several network sizes and fleet sizes, plus a short end-to-end
+Simulation.run. The synthetic grid networks are generated in Locations/ on the first run.
+
+The parallel benchmark times end-to-end runs with the DP policy advanced in the main process and in a child process
+(Simulation.parallel). The speedup needs a free cpu for the child, so it is reported with the cpu count of the host
+and is not compared with the baseline. The overlap bound is the speedup of a host with enough cpus, estimated from a
+profiled serial run: the phases of the policies in a step run at the same time, the other phases and the exchange
+with the child do not.
+
+Results are written to results/benchmark.json and compared with the stored baseline
+results/benchmark_baseline.json, benchmarks slower than the baseline by more than the threshold are reported as
+regressions (exit code 1). Wall times depend on the machine, so every timing is also stored normalized by the time
+of a fixed calibration workload (numpy and interpreted Python) measured in the same run, and the comparison uses the
+normalized timings. This only corrects for the overall speed of the host: a host with another cpu, python or numpy
+version can still shift single benchmarks by more than the default threshold, a warning is printed when the baseline
+was recorded on another host. For exact comparisons, record a baseline on the host with --save-baseline first.
+
+Run `python benchmark.py [--repeats 5] [--threshold 1.5] [--save-baseline] [--parallel]`
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+
+import numpy as np
+
+from dp_network import DPNetwork
+from fleet import Fleet
+from network import Network
+from network_generator import generate_network
+from profiler import StepProfiler
+from run_log import RunLog
+from simulation import Simulation
+from traffic_generator import TrafficGenerator
+from trip_stats import TripStats
+
+NETWORKS = ['SiouxFalls', 'BenchGrid256', 'BenchGrid1024']  # 24, 256 and 1024 vertices
+FLEET_SIZES = [1000, 10000, 100000]  # number of cars, or of routing queries
+RESULTS = 'results/benchmark.json'
+BASELINE = 'results/benchmark_baseline.json'
+
+
+def measure(fn, setup=None, repeats=5, min_time=0.02):
+    """
+    Time fn(*setup()) over repeats, setup is not timed
+    Each repeat calls fn until at least min_time (s) was spent in it, to average out the timer noise of fast calls
+    Return the minimum and median wall time (s) per call
+    """
+    times = []
+    for _ in range(repeats):
+        total, num_calls = 0, 0
+        while total < min_time or num_calls == 0:
+            args = setup() if setup is not None else ()
+            start = time.perf_counter()
+            fn(*args)
+            total += time.perf_counter() - start
+            num_calls += 1
+        times.append(total / num_calls)
+    return min(times), float(np.median(times))
+
+
+def calibration_workload(size=100000):
+    # fixed mix of numpy and interpreted Python work, the unit of the normalized timings
+    values = np.random.RandomState(0).uniform(size=size)
+    np.sort(values)
+    np.cumsum(values)
+    return sum(i * i for i in range(size))
+
+
+def host():
+    # description of the host, timings of different hosts are only compared through the normalized timings
+    return {'python': sys.version.split()[0], 'numpy': np.__version__, 'machine': platform.machine(),
+            'processor': platform.processor(), 'cpu_count': os.cpu_count()}
+
+
+def ensure_network(city):
+    # generate the synthetic grids if they do not exist
+    if city.startswith('BenchGrid') and not os.path.exists(os.path.join('Locations', city)):
+        generate_network('grid', int(city[len('BenchGrid'):]), city)
+    return None
+
+
+def random_fleet(network, generator, num_cars, rng):
+    """
+    Fleet of num_cars cars on random OD pairs of the OD table, placed at random legs of their routes
+    """
+    od_index = rng.randint(generator.num_od, size=num_cars)
+    unique_od, route_index = np.unique(od_index, return_inverse=True)
+    routes = [network.route(int(generator.origin[i]), int(generator.destination[i])) for i in unique_od.tolist()]
+
+    fleet = Fleet()
+    fleet.add(car_id=np.arange(num_cars), origin=generator.origin[od_index],
+              destination=generator.destination[od_index], routes=[r[0] for r in routes],
+              route_index=route_index, start_time=0,
+              estimated_trip_time=np.array([r[1] for r in routes])[route_index])
+
+    s = fleet.state
+    s['leg'] = rng.randint(s['path_length'])
+    s['current_edge'] = fleet.path_edges[s['path_offset'] + s['leg']]
+    s['current_edge_progress'] = rng.uniform(size=num_cars)
+
+    return fleet
+
+
+def completed_fleet(fleet, rng):
+    # fleet with all cars of fleet as completed trips, in random order of completion
+    completed = Fleet()
+    completed.path_edges = fleet.path_edges
+    completed.state = {f: v.copy() for f, v in fleet.state.items()}
+    completed.state['finish_time'] = rng.randint(1, 720, size=len(fleet))
+    completed.remove(rng.permutation(len(fleet)))
+    return completed
+
+
+def run_network_benchmarks(city, repeats, rng):
+    ensure_network(city)
+    network = Network(city=city)
+    dp_network = DPNetwork(eps=0.1, city=city, rng=rng)
+    generator = TrafficGenerator(delta_t=10, demand_scenario='baseline', rng=rng, city=city)
+    results = []
+
+    def record(name, size, timing):
+        results.append({'name': name, 'network': city, 'num_vertices': network.num_vertices,
+                        'num_edges': network.num_edges, 'size': size, 'repeats': repeats,
+                        'min': timing[0], 'median': timing[1]})
+
+    # routing tables and queries
+    record('update_predecessor_matrix', 0, measure(network._update_predecessor_matrix, lambda: (network.latency,),
+                                                   repeats=repeats))
+    network.min_distance_matrix, network.predecessor_matrix = network._update_predecessor_matrix(network.latency)
+    od_pairs = list(zip(generator.origin[:1000].tolist(), generator.destination[:1000].tolist()))
+
+    def route_all(pairs):
+        network.route_cache = {}
+        for o, d in pairs:
+            network.shortest_path(o, d)
+            network.estimate_travel_time(o, d)
+
+    record('shortest_path', len(od_pairs), measure(route_all, lambda: (od_pairs,), repeats=repeats))
+
+    def clear_routes():
+        network.route_cache = {}
+        return ()
+
+    # car generation for one time step, at the demand of the OD table scaled to the number of cars
+    for num_cars in FLEET_SIZES:
+        demand = rng.poisson(generator.rate * num_cars / max(generator.rate.sum(), 1e-9))
+        record('new_cars', num_cars, measure(lambda: generator.new_cars(start_time=0, network=network,
+                                                                        new_traffic=demand),
+                                             clear_routes, repeats=repeats))
+
+    for num_cars in FLEET_SIZES:
+        fleet = random_fleet(network, generator, num_cars, rng)
+        state = fleet.state
+
+        def fresh_fleet():
+            fleet.state = {f: v.copy() for f, v in state.items()}
+            return ()
+
+        counts = fleet.traffic_count(network.num_edges)
+        record('counts_to_latency', num_cars, measure(network._counts_to_latency, lambda: (counts,),
+                                                      repeats=repeats))
+        record('update_locations', num_cars, measure(lambda: fleet.update_locations(network=network, delta_t=10),
+                                                     fresh_fleet, repeats=repeats))
+        record('dp_update_latency', num_cars, measure(dp_network.update_latency, lambda: (fleet,),
+                                                      repeats=repeats))
+        fresh_fleet()
+
+        # pairing and statistics of num_cars trips completed in both networks
+        sim = Simulation(demand_scenario='baseline', eps=0.1, city=city)
+        cars, dp_cars = completed_fleet(fleet, rng), completed_fleet(fleet, rng)
+
+        def compute_car_stats_df():
+            sim.trip_stats = TripStats(fleet=cars, dp_fleet=dp_cars, trip_time=sim._trip_time)
+            sim.trip_stats.add(trips=cars.completed_chunks, dp_trips=dp_cars.completed_chunks)
+            return sim._compute_car_stats_df()
+
+        record('compute_car_stats_df', num_cars, measure(compute_car_stats_df, repeats=repeats))
+
+    # one hour of run log (360 steps) without writing files
+    log_t = {'t': 0, 'new_cars_added': 0, 'cars_in_transit': 0, 'completed_trips': 0,
+             'edge_utilization': network.edge_utilization}
+    sim = Simulation(demand_scenario='baseline', eps=0.1, city=city)
+
+    def update_run_log():
+        sim.run_log = RunLog(fname=None)
+        for _ in range(360):
+            sim._update_run_log(log_t)
+
+    record('update_run_log', 0, measure(update_run_log, repeats=repeats))
+
+    return results
+
+
+def run_end_to_end(repeats, max_time=60):
+    # short horizon run on SiouxFalls, without logging to disk and plotting
+    def setup():
+        sim = Simulation(demand_scenario='baseline', eps=0.1)
+        sim.max_time = max_time
+        sim.progress_bar = False
+        sim.plot_log = False
+        return (sim,)
+
+    timing = measure(lambda sim: sim.run(), setup, repeats=repeats)
+    return [{'name': 'simulation_run_%dsteps' % max_time, 'network': 'SiouxFalls', 'num_vertices': 24,
+             'num_edges': 76, 'size': 0, 'repeats': repeats, 'min': timing[0], 'median': timing[1]}]
+
+
+def overlap_bound(profile):
+    """
+    Speedup of the parallel mode if the phases of the reference and the compared policies of a step fully overlap
+    profile is the StepProfiler table of a serial run, the reference rows first in each step
+    """
+    reference = profile.groupby('t').head(1).set_index('t')
+    compared = profile.drop(index=profile.groupby('t').head(1).index).set_index('t')
+    shared = reference['demand'] + reference['trip_stats']
+    reference_time = reference[['latency_update', 'spawn', 'move', 'log']].sum(axis=1)
+    compared_time = compared[['latency_update', 'spawn', 'move']].sum(axis=1).groupby('t').max()
+    serial_time = profile[StepProfiler.phases].to_numpy().sum()
+    return serial_time / (shared + np.maximum(reference_time, compared_time)).sum()
+
+
+def run_parallel(repeats, configurations=(('SiouxFalls', 'high', 720), ('BenchGrid1024', 'baseline', 60))):
+    """
+    Wall time of end-to-end runs with the DP policy in the main process and in a child process
+    """
+    results = []
+    for city, demand_scenario, max_time in configurations:
+        ensure_network(city)
+
+        def setup(parallel=False, profile=False):
+            sim = Simulation(demand_scenario=demand_scenario, eps=0.1, city=city)
+            sim.max_time = max_time
+            sim.progress_bar = False
+            sim.plot_log = False
+            sim.parallel = parallel
+            sim.profile = profile
+            return (sim,)
+
+        serial = measure(lambda sim: sim.run(), setup, repeats=repeats)
+        parallel = measure(lambda sim: sim.run(), lambda: setup(parallel=True), repeats=repeats)
+        sim = setup(profile=True)[0]
+        sim.run()
+        bound = float(overlap_bound(sim.profiler.to_df()))
+        results.append({'network': city, 'demand_scenario': demand_scenario, 'steps': max_time,
+                        'cpu_count': os.cpu_count(), 'serial_min': serial[0], 'parallel_min': parallel[0],
+                        'speedup': serial[0] / parallel[0], 'overlap_bound': bound})
+    return results
+
+
+def normalize(results, calibration):
+    # minimum time of each benchmark in units of the calibration workload
+    for r in results:
+        r['normalized'] = r['min'] / calibration
+    return None
+
+
+def compare(results, baseline, threshold):
+    """
+    Ratio of the normalized minimum time to the baseline for each benchmark found in the baseline
+    The minimum is the least sensitive to other load on the machine
+    Return the list of regressions, (key, ratio) with ratio > threshold
+    """
+    reference = {(b['name'], b['network'], b['size']): b['normalized'] for b in baseline['benchmarks']}
+    regressions = []
+    for r in results:
+        key = (r['name'], r['network'], r['size'])
+        if key in reference and reference[key] > 0:
+            r['baseline_normalized'] = reference[key]
+            r['ratio'] = r['normalized'] / reference[key]
+            if r['ratio'] > threshold:
+                regressions.append((key, r['ratio']))
+    return regressions
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Benchmark the simulation hot paths')
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--threshold', type=float, default=1.5,
+                        help='normalized min / baseline ratio of a regression')
+    parser.add_argument('--networks', nargs='+', default=NETWORKS)
+    parser.add_argument('--output', default=RESULTS)
+    parser.add_argument('--baseline', default=BASELINE)
+    parser.add_argument('--save-baseline', action='store_true', help='store the results as the new baseline')
+    parser.add_argument('--parallel', action='store_true', help='also run the parallel benchmark')
+    args = parser.parse_args()
+
+    rng = np.random.RandomState(1729)
+    calibration = measure(calibration_workload, repeats=args.repeats)[0]
+    results = []
+    for city in args.networks:
+        results.extend(run_network_benchmarks(city, args.repeats, rng))
+    results.extend(run_end_to_end(args.repeats))
+    normalize(results, calibration)
+    parallel = run_parallel(args.repeats) if args.parallel else []
+
+    regressions = []
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline['host'] != host():
+            print('[Benchmark] The baseline was recorded on another host (%s), only the normalized timings are '
+                  'compared' % baseline['host'])
+        regressions = compare(results, baseline, args.threshold)
+
+    print('calibration workload %.3f ms' % (1000 * calibration))
+    for r in results:
+        print('%-28s %-14s size %7d  min %9.3f ms  normalized %9.4f  %s' % (
+            r['name'], r['network'], r['size'], 1000 * r['min'], r['normalized'],
+            'x%.2f' % r['ratio'] if 'ratio' in r else ''))
+
+    for r in parallel:
+        print('parallel %-14s %-8s %4d steps  serial %8.3f s  parallel %8.3f s  speedup x%.2f  overlap bound x%.2f  '
+              '(%d cpus)' % (r['network'], r['demand_scenario'], r['steps'], r['serial_min'], r['parallel_min'],
+                             r['speedup'], r['overlap_bound'], r['cpu_count']))
+
+    report = {'host': host(), 'calibration': calibration, 'benchmarks': results, 'parallel': parallel}
+    os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    with open(args.baseline if args.save_baseline else args.output, 'w') as f:
+        json.dump(report, f, indent=1)
+
+    if len(regressions) > 0:
+        for key, ratio in regressions:
+            print('[Benchmark] Regression %s: x%.2f of the baseline' % (key, ratio))
+        sys.exit(1)
@@ -1,35 +1,19 @@
 import numpy as np
 import matplotlib.pyplot as plt
 
+from counts_to_flow import solve_x_star
+
 
 def plot_x_star(y_max, dy):
     # plot the solution to
     # y = x + 0.15 x^5
 
-    Y = np.arange(0,y_max, dy)
-    x_star = np.zeros(Y.shape)
-    for i, y in enumerate(Y):
-        if i == 0:
-            x_star[i] = compute_x_star(y, 0, dy)
-        else:
-            x_star[i] = compute_x_star(y, x_star[i-1], dy)
+    Y = np.arange(int(round(y_max / dy))) * dy
+    x_star = solve_x_star(Y)
 
     return Y, x_star
 
 
-def compute_x_star(y, x_0, dx):
-    # compute the solution to
-    # y = x + 0.15 x^5
-    # where x_0 is a known lower bound on x_star.
-
-    x = x_0 + dx
-
-    while x + 0.15 * x ** 5 < y:
-        x = x + dx
-
-    return x - dx
-
-
 if __name__ == '__main__':
     y_max = 200
     dy = 0.001
@@ -42,9 +26,7 @@ if __name__ == '__main__':
     #######################################################################
     # Y, x_star = np.load('counts2flow_LUT.npy')
 
-    error = 0
-    for i in range(Y.shape[0]):
-        error = error + np.abs(x_star[i] + 0.15*x_star[i]**5 - Y[i])
+    error = np.sum(np.abs(x_star + 0.15*x_star**5 - Y))
     print('Total estimation error: {}'.format(error))
 
     # plot counts to flow 
@@ -65,6 +47,8 @@ if __name__ == '__main__':
     # plt.savefig('counts2time.png')
 
     # save the counts to flow lookup table 
+    # Note: the table shipped with the repo was computed by stepping x in increments of dx = dy,
+    # overwriting it with the exact solution slightly changes the simulation results
     #######################################################################
     np.save('counts2flow_LUT_ymax'+str(y_max)+'.npy', (Y,x_star))
     
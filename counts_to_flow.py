@@ -0,0 +1,80 @@
+"""
+Mapping from normalized traffic counts y to normalized flow x_star
+
+x_star is the solution of y = x + 0.15 x^5 (refer to paper for details).
+The mapping is tabulated on a regular grid of y, from 0 to y_max with `resolution` points per unit count.
+Counts outside of the table are solved directly.
+"""
+import numpy as np
+
+DEFAULT_LUT = 'counts2flow_LUT_ymax200.npy'
+
+
+def solve_x_star(y, b=0.15, tol=1e-12, max_iter=100):
+    """
+    Solve y = x + b x^5 for an array of y >= 0 with batched Newton iterations
+    The iterations start from an upper bound of the solution (x <= y and b x^5 <= y), since the
+    function is convex and increasing, Newton then converges monotonically from above.
+    """
+    y = np.asarray(y, dtype=float)
+    x = np.minimum(y, (y / b) ** 0.2)
+
+    for _ in range(max_iter):
+        step = (x + b * x ** 5 - y) / (1 + 5 * b * x ** 4)
+        x = x - step
+        if np.all(np.abs(step) <= tol * np.maximum(x, 1)):
+            break
+
+    return x
+
+
+class CountsToFlow:
+
+    def __init__(self, y_max=200, resolution=1000, x_star=None, interpolate=False):
+
+        self.y_max = y_max
+        self.resolution = resolution  # number of table entries per unit count
+        self.interpolate = interpolate  # linear interpolation between table entries, else truncation
+
+        if x_star is None:
+            x_star = solve_x_star(np.arange(int(round(y_max * resolution))) / resolution)
+        self.x_star = x_star
+        self.size = self.x_star.shape[0]
+
+    @classmethod
+    def load(cls, path=DEFAULT_LUT, interpolate=False, mmap_mode=None):
+        """
+        Load a table saved as (Y, x_star), e.g. by c_star.py
+        """
+        Y, x_star = np.load(path, mmap_mode=mmap_mode)
+        resolution = int(round(1 / (Y[1] - Y[0])))
+        return cls(y_max=Y.shape[0] / resolution, resolution=resolution, x_star=x_star, interpolate=interpolate)
+
+    def save(self, path):
+        Y = np.arange(self.size) / self.resolution
+        np.save(path, (Y, self.x_star))
+        return None
+
+    def __call__(self, y):
+        """
+        Input: normalized counts y (array)
+        Return: normalized flow x_star
+        """
+        y = np.asarray(y, dtype=float)
+        position = y * self.resolution
+        j = position.astype(int)
+
+        if self.interpolate:
+            in_range = position <= self.size - 1
+            j = np.minimum(j, self.size - 2)
+            w = position - j
+            x = self.x_star[j] * (1 - w) + self.x_star[j + 1] * w
+        else:
+            in_range = j < self.size
+            x = self.x_star[np.minimum(j, self.size - 1)]
+
+        # counts beyond the table are solved directly
+        if not np.all(in_range):
+            x[~in_range] = solve_x_star(y[~in_range])
+
+        return x
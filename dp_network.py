@@ -8,60 +8,83 @@ import numpy as np
 
 class DPNetwork(Network):
 
-    def __init__(self, eps=None, capacity_scenario=None):
+    def __init__(self, eps=None, capacity_scenario=None, lazy_routing=False, rng=None, city='SiouxFalls',
+                 incremental_routing=False):
 
-        Network.__init__(self, capacity_scenario=capacity_scenario)
+        Network.__init__(self, capacity_scenario=capacity_scenario, lazy_routing=lazy_routing, city=city,
+                         incremental_routing=incremental_routing)
 
         self.epsilon = eps
 
+        # random number generator for the Laplace noise
+        self.rng = np.random if rng is None else rng
+
         self.dp_traffic_counts = None
         self.dp_latency = None
         self.dp_predecessor_matrix = None
         self.dp_min_distance_matrix = None
+        self.next_noise = None  # Laplace noise of the next latency update, if drawn ahead of the update
+
+    def draw_noise(self):
+        """
+        Draw the Laplace noise of the next latency update
+        The simulation draws it ahead of the update so that the draws keep their order when networks run in parallel
+        """
+        self.next_noise = self.rng.laplace(scale=1/self.epsilon, size=self.num_edges)
+        return None
 
-    def update_latency(self, cars):
+    def update_latency(self, fleet):
         """
         Main addition is computing noisy traffic counts and updating noisy latency
         """
 
         # get new self.traffic counts
-        self.traffic_count = np.zeros(self.num_edges)
-        for car in cars:
-            current_edge = car.current_edge
-            self.traffic_count[current_edge] += 1
+        self.traffic_count = fleet.traffic_count(self.num_edges)
 
         # compute noisy traffic counts
-        noisy_counts = [counts + np.random.laplace(scale=1/self.epsilon) for counts in self.traffic_count]
-        self.dp_traffic_counts = [max(c, 0) for c in noisy_counts]
+        if self.next_noise is None:
+            self.draw_noise()
+        noisy_counts = self.traffic_count + self.next_noise
+        self.next_noise = None
+        dp_traffic_counts = np.maximum(noisy_counts, 0)
 
         # call the counts to latency function
-        self.latency = self._counts_to_latency(self.traffic_count)
-        self.dp_latency = self._counts_to_latency(self.dp_traffic_counts)
+        self.set_noisy_latency(latency=self._counts_to_latency(self.traffic_count),
+                               dp_traffic_counts=dp_traffic_counts,
+                               dp_latency=self._counts_to_latency(dp_traffic_counts))
+
+        return None
+
+    def set_noisy_latency(self, latency=None, dp_traffic_counts=None, dp_latency=None):
+        """
+        Update the true and noisy latency and the routing tables
+        Used directly when the noisy latency of several replicates is computed in a batch
+        """
+        self.latency = latency
+        self.dp_traffic_counts = dp_traffic_counts
+        self.dp_latency = dp_latency
 
         # update predecessor matrix that stores the shortest paths
-        self.dp_min_distance_matrix, self.dp_predecessor_matrix = self._update_predecessor_matrix(self.dp_latency)
+        if not self.deferred_routing and self.refresh_due(self.routing_latency()):
+            self.publish_routing_tables(self.compute_routing_tables(self.routing_latency()))
+
+        return None
+
+    def routing_latency(self):
+        return self.dp_latency
 
+    def publish_routing_tables(self, tables):
+        self.dp_min_distance_matrix, self.dp_predecessor_matrix = tables
+        self.route_cache = {}
         return None
 
-    def shortest_path(self, origin, destination):
+    def _routing_tables(self):
         """
-        Need to return the shortest path based on a noisy estimate of the travel counts
+        Routing (shortest paths and travel time estimates) is based on the noisy estimate of the travel counts
         """
 
         # Cautionary check if DP predecessor matrix is not initialized
         if self.dp_predecessor_matrix is None:
             self.dp_min_distance_matrix, self.dp_predecessor_matrix = self._update_predecessor_matrix(self.dp_latency)
 
-        edge_path = self._path_from_predecessor(origin, destination, self.dp_predecessor_matrix)
-
-        return edge_path
-
-    def estimate_travel_time(self, origin, destination):
-        """
-        Need to override and estimate travel time based on noisy counts measurement
-        """
-        path = self.shortest_path(origin, destination)
-        tt = 0
-        for edge_index in path:
-            tt += self.dp_latency[edge_index]
-        return tt
+        return self.dp_min_distance_matrix, self.dp_predecessor_matrix
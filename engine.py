@@ -0,0 +1,178 @@
+"""
+Engines that move the cars of a fleet on a network
+
+SteppedEngine advances every car at every time step.
+EventEngine schedules the time step at which each car exits its edge in a priority queue (heap) and only
+processes the cars whose events fall in the current time step. The latency update is the only scheduled
+event that touches all cars. Both engines produce the same trips: within a latency epoch the progress of a
+car is accumulated in the same order of floating point additions as in the stepped engine.
+"""
+import heapq
+
+import numpy as np
+
+
+class SteppedEngine:
+
+    def __init__(self, network=None, fleet=None, delta_t=None, update_interval=None, multi_edge=False):
+        self.network = network
+        self.fleet = fleet
+        self.delta_t = delta_t
+        self.multi_edge = multi_edge  # cars can traverse several edges per time step
+
+    def update_latency(self, t):
+        self.network.update_latency(self.fleet)  # update latency as a function of active cars
+        return None
+
+    def step(self, t, new_cars):
+        self.fleet.add(**new_cars)  # draw new demand for this time step
+
+        # update location for each car depending on current network state
+        just_completed = self.fleet.update_locations(network=self.network, delta_t=self.delta_t,
+                                                     multi_edge=self.multi_edge)
+
+        # remove completed trips from active cars
+        return self.fleet.remove_completed(just_completed)
+
+    def num_in_transit(self):
+        return len(self.fleet)
+
+    def finish(self):
+        return None
+
+
+class EventEngine:
+
+    def __init__(self, network=None, fleet=None, delta_t=None, update_interval=None, multi_edge=False):
+        if multi_edge:
+            raise ValueError('The event engine moves cars by at most one edge per time step')
+
+        self.network = network
+        self.fleet = fleet
+        self.delta_t = delta_t
+        self.update_interval = update_interval  # time steps between latency updates
+
+        # current latency epoch [epoch_start, epoch_end)
+        self.epoch_start = 0
+        self.epoch_end = 0
+        self.increment = None  # edge progress per time step on each edge
+        self.steps_to_exit = None  # time steps to traverse each edge from its start, 0 if not within an epoch
+
+        # time step of the first progress increment since current_edge_progress was set, for each car
+        self.entry_step = np.zeros(0, dtype=np.int64)
+
+        self.events = []  # heap of (exit time step, car index)
+        self.completed = []  # index of the cars that completed their trip in the current epoch
+        self.num_active = 0
+
+    def _accumulate(self, progress, increment, num_steps):
+        """
+        Edge progress after each of the next steps, added one step at a time as in the stepped engine
+        Return an array (cars, update_interval + 1), increments stop after num_steps
+        """
+        steps = np.arange(self.update_interval)
+        progress_log = np.empty((progress.shape[0], self.update_interval + 1))
+        progress_log[:, 0] = progress
+        progress_log[:, 1:] = np.where(steps < num_steps[:, None], increment[:, None], 0)
+        return np.add.accumulate(progress_log, axis=1)
+
+    def _first_exit(self, progress_log):
+        # number of steps until the edge is traversed, 0 if it is not traversed within the epoch
+        traversed = progress_log[:, 1:] > 1
+        return np.where(traversed.any(axis=1), traversed.argmax(axis=1) + 1, 0)
+
+    def _schedule(self, index, first_step, steps_to_exit):
+        # push the exit events that fall in the current epoch
+        exit_step = first_step + steps_to_exit - 1
+        in_epoch = (steps_to_exit > 0) & (exit_step < self.epoch_end)
+        for e, i in zip(exit_step[in_epoch].tolist(), index[in_epoch].tolist()):
+            heapq.heappush(self.events, (e, i))
+        return None
+
+    def _remove_completed(self):
+        # store completed trips in order of completion, as in the stepped engine
+        if len(self.completed) > 0:
+            index = np.asarray(self.completed, dtype=np.int64)
+            index = index[np.lexsort((index, self.fleet.state['finish_time'][index]))]
+            remaining = np.ones(len(self.fleet), dtype=bool)
+            remaining[index] = False
+            self.fleet.remove(index)
+            self.entry_step = self.entry_step[remaining]
+            self.completed = []
+        return None
+
+    def update_latency(self, t):
+        # bring the edge progress of every car up to date with the latency of the ending epoch
+        self._remove_completed()
+        state = self.fleet.state
+        edge = state['current_edge']
+        if self.increment is not None:
+            progress_log = self._accumulate(state['current_edge_progress'], self.increment[edge], t - self.entry_step)
+            state['current_edge_progress'] = progress_log[:, -1]
+        self.entry_step = np.full(len(self.fleet), t, dtype=np.int64)
+
+        self.network.update_latency(self.fleet)  # update latency as a function of active cars
+
+        # edge progress per step for the new epoch
+        edge_length = self.network.edge_distance
+        distance_covered = self.delta_t * (edge_length / np.asarray(self.network.latency))
+        self.increment = distance_covered / edge_length
+        self.epoch_start = t
+        self.epoch_end = t + self.update_interval
+
+        num_edges = self.network.num_edges
+        self.steps_to_exit = self._first_exit(self._accumulate(np.zeros(num_edges), self.increment,
+                                                               np.full(num_edges, self.update_interval)))
+
+        # schedule the edge exits of all cars in the new epoch
+        self.events = []
+        progress_log = self._accumulate(state['current_edge_progress'], self.increment[edge],
+                                        np.full(len(self.fleet), self.update_interval))
+        self._schedule(np.arange(len(self.fleet)), t, self._first_exit(progress_log))
+
+        return None
+
+    def step(self, t, new_cars):
+
+        # add new cars, their first step on the edge is this time step
+        first = len(self.fleet)
+        self.fleet.add(**new_cars)
+        num_new = len(self.fleet) - first
+        self.entry_step = np.concatenate([self.entry_step, np.full(num_new, t, dtype=np.int64)])
+        self.num_active += num_new
+        state = self.fleet.state
+        index = np.arange(first, first + num_new)
+        self._schedule(index, t, self.steps_to_exit[state['current_edge'][index]])
+
+        # cars that exit their edge in this time step
+        exits = []
+        while len(self.events) > 0 and self.events[0][0] == t:
+            exits.append(heapq.heappop(self.events)[1])
+        if len(exits) == 0:
+            return 0
+        index = np.asarray(exits, dtype=np.int64)
+
+        state['leg'][index] += 1
+        done = state['leg'][index] >= state['path_length'][index]
+
+        # completed trips
+        completed = index[done]
+        state['finish_time'][completed] = t + 1
+        self.completed.extend(completed.tolist())
+        self.num_active -= completed.shape[0]
+
+        # move to the next edge, starting with the next time step
+        moving = index[~done]
+        state['current_edge'][moving] = self.fleet.path_edges[state['path_offset'][moving] + state['leg'][moving]]
+        state['current_edge_progress'][moving] = 0
+        self.entry_step[moving] = t + 1
+        self._schedule(moving, t + 1, self.steps_to_exit[state['current_edge'][moving]])
+
+        return completed.shape[0]
+
+    def num_in_transit(self):
+        return self.num_active
+
+    def finish(self):
+        self._remove_completed()
+        return None
@@ -0,0 +1,233 @@
+"""
+Struct of arrays store for all cars routed on a network
+
+State of each car in transit: ID, OD pair, current edge, leg index on the path, edge progress, start/finish time
+Paths are stored once per distinct route in a flat edge buffer, cars keep an offset and a length into it
+
+Methods: Add cars, update locations of all cars, remove completed trips, traffic counts
+"""
+
+from itertools import chain
+
+import numpy as np
+
+
+class Fleet:
+
+    int_fields = ['id', 'origin', 'destination', 'current_edge', 'leg', 'start_time', 'finish_time',
+                  'path_offset', 'path_length']
+    float_fields = ['current_edge_progress', 'estimated_trip_time', 'finish_offset']
+
+    def __init__(self):
+
+        # state of the cars in transit, one entry per car
+        self.state = {f: np.zeros(0, dtype=np.int64) for f in self.int_fields}
+        self.state.update({f: np.zeros(0, dtype=float) for f in self.float_fields})
+
+        # flat buffer with the edge sequence of every distinct route, grown by doubling its capacity
+        self.path_buffer = np.zeros(0, dtype=np.int64)
+        self.num_path_edges = 0  # used entries of path_buffer
+        self.route_offsets = {}  # key: route (tuple of edges), value: offset in path_edges
+
+        # completed trips, stored as a list of chunks with the same fields as self.state
+        self.completed_chunks = []
+        self.num_drained = 0  # completed trips released by drain_completed
+
+    def __len__(self):
+        return self.state['id'].shape[0]
+
+    @property
+    def current_edge(self):
+        return self.state['current_edge']
+
+    @property
+    def path_edges(self):
+        return self.path_buffer[:self.num_path_edges]
+
+    @path_edges.setter
+    def path_edges(self, values):
+        self.path_buffer = np.asarray(values, dtype=np.int64)
+        self.num_path_edges = self.path_buffer.shape[0]
+
+    def _route_offsets(self, routes):
+        # offsets of the routes in path_edges, the routes not seen before are appended in one copy
+        offsets = np.empty(len(routes), dtype=np.int64)
+        new_routes = []
+        end = self.num_path_edges
+        for i, route in enumerate(routes):
+            offset = self.route_offsets.get(route)
+            if offset is None:
+                offset = end
+                self.route_offsets[route] = offset
+                new_routes.append(route)
+                end += len(route)
+            offsets[i] = offset
+
+        if len(new_routes) > 0:
+            self._append_paths(np.fromiter(chain.from_iterable(new_routes), dtype=np.int64,
+                                           count=end - self.num_path_edges))
+        return offsets
+
+    def _append_paths(self, edges):
+        end = self.num_path_edges + edges.shape[0]
+        if end > self.path_buffer.shape[0]:
+            # amortized growth, the buffer is copied once per doubling of its size
+            buffer = np.empty(max(end, 2 * self.path_buffer.shape[0]), dtype=np.int64)
+            buffer[:self.num_path_edges] = self.path_buffer[:self.num_path_edges]
+            self.path_buffer = buffer
+        self.path_buffer[self.num_path_edges:end] = edges
+        self.num_path_edges = end
+        return None
+
+    def add(self, car_id=None, origin=None, destination=None, routes=None, route_index=None, start_time=None,
+            estimated_trip_time=None):
+        """
+        Add a batch of cars. routes is a sequence of edge paths (tuples) and route_index gives the
+        route of each car. Without route_index, every car has its own entry in routes
+        """
+        num_cars = len(car_id)
+        if num_cars == 0:
+            return None
+
+        route_offset = self._route_offsets(routes)
+        route_length = np.fromiter((len(r) for r in routes), dtype=np.int64, count=len(routes))
+        if route_index is None:
+            path_offset, path_length = route_offset, route_length
+        else:
+            path_offset, path_length = route_offset[route_index], route_length[route_index]
+        start_time = np.broadcast_to(np.asarray(start_time, dtype=np.int64), (num_cars,))
+
+        new_state = {'id': car_id,
+                     'origin': origin,
+                     'destination': destination,
+                     'current_edge': self.path_edges[path_offset],
+                     'leg': np.zeros(num_cars, dtype=np.int64),
+                     'start_time': start_time,
+                     'finish_time': start_time,
+                     'path_offset': path_offset,
+                     'path_length': path_length,
+                     'current_edge_progress': np.zeros(num_cars),  # 0 is start of an edge, 1 is completion
+                     'estimated_trip_time': estimated_trip_time,
+                     'finish_offset': np.zeros(num_cars)}  # fraction of the last time step not used by the trip
+
+        for f, values in new_state.items():
+            self.state[f] = np.concatenate([self.state[f], np.asarray(values, dtype=self.state[f].dtype)])
+
+        return None
+
+    def update_locations(self, network=None, delta_t=None, multi_edge=False):
+        """
+        Move all cars by one time step based on the current network state and
+        return a boolean mask of the cars that completed their trip
+        With multi_edge, cars carry the time left after traversing an edge to the next edges
+        """
+        if multi_edge:
+            return self._update_locations_multi_edge(network=network, delta_t=delta_t)
+
+        s = self.state
+        edge = s['current_edge']
+
+        # update edge progress
+        edge_length = network.edge_distance[edge]
+        distance_covered = delta_t * (edge_length / np.asarray(network.latency)[edge])
+        s['current_edge_progress'] += distance_covered / edge_length
+
+        # Update status of cars that completely traversed their edge
+        traversed = s['current_edge_progress'] > 1
+        s['current_edge_progress'][traversed] = 0
+        s['leg'][traversed] += 1
+        completed = traversed & (s['leg'] >= s['path_length'])
+
+        # move to the next edge where edges are remaining in the path
+        moving = traversed & ~completed
+        s['current_edge'][moving] = self.path_edges[s['path_offset'][moving] + s['leg'][moving]]
+
+        s['finish_time'] += 1
+
+        return completed
+
+    def _update_locations_multi_edge(self, network=None, delta_t=None):
+        s = self.state
+        latency = np.asarray(network.latency)
+
+        time_left = np.full(len(self), float(delta_t))
+        completed = np.zeros(len(self), dtype=bool)
+
+        # each pass moves the cars that can traverse the rest of their edge by one edge
+        active = np.arange(len(self))
+        while active.shape[0] > 0:
+            edge_latency = latency[s['current_edge'][active]]
+            time_to_exit = (1 - s['current_edge_progress'][active]) * edge_latency
+            exits = time_to_exit <= time_left[active]
+
+            # cars that stay on their edge for the rest of the time step
+            stay = active[~exits]
+            s['current_edge_progress'][stay] += time_left[stay] / edge_latency[~exits]
+
+            # cars that traverse their edge
+            traversed = active[exits]
+            time_left[traversed] -= time_to_exit[exits]
+            s['leg'][traversed] += 1
+            done = s['leg'][traversed] >= s['path_length'][traversed]
+
+            # fractional finish time of completed trips
+            finished = traversed[done]
+            completed[finished] = True
+            s['finish_offset'][finished] = -time_left[finished] / delta_t
+
+            # move to the next edge where edges are remaining in the path
+            moving = traversed[~done]
+            s['current_edge'][moving] = self.path_edges[s['path_offset'][moving] + s['leg'][moving]]
+            s['current_edge_progress'][moving] = 0
+            active = moving[time_left[moving] > 0]
+
+        s['finish_time'] += 1
+
+        return completed
+
+    def remove_completed(self, completed):
+        """
+        Remove the cars in the completed mask from the cars in transit and store them as completed trips
+        Return the number of removed cars
+        """
+        return self.remove(np.nonzero(completed)[0])
+
+    def remove(self, index):
+        """
+        Remove the cars at index from the cars in transit and store them as completed trips, in the order of index
+        Return the number of removed cars
+        """
+        num_completed = index.shape[0]
+        if num_completed > 0:
+            self.completed_chunks.append({f: v[index] for f, v in self.state.items()})
+            remaining = np.ones(len(self), dtype=bool)
+            remaining[index] = False
+            self.state = {f: v[remaining] for f, v in self.state.items()}
+        return num_completed
+
+    def add_copied(self, chunks, path_edges):
+        """
+        Add the completed trips of a copy of the fleet in another process, with the route edges the copy appended to
+        its path_edges since the last call, so that the offsets of the trips point to the same routes
+        """
+        self._append_paths(path_edges)
+        self.completed_chunks.extend(chunks)
+        return None
+
+    def drain_completed(self):
+        """
+        Return the chunks of completed trips stored since the last call and release them from the fleet
+        """
+        chunks = self.completed_chunks
+        self.completed_chunks = []
+        self.num_drained += sum(c['id'].shape[0] for c in chunks)
+        return chunks
+
+    def num_completed(self):
+        return self.num_drained + sum(c['id'].shape[0] for c in self.completed_chunks)
+
+    def path(self, path_offset, path_length):
+        return self.path_edges[path_offset:path_offset + path_length]
+
+    def traffic_count(self, num_edges):
+        return np.bincount(self.current_edge, minlength=num_edges).astype(float)
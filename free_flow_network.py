@@ -0,0 +1,46 @@
+"""
+Network routed without traffic information
+
+Cars are routed on the free flow travel times, which never change, so the routes are computed once and kept for
+the whole run, a refresh policy or a routing buffer never refreshes them. The latency that moves the cars is still
+updated from the traffic counts.
+"""
+import numpy as np
+
+from network import Network
+
+
+class FreeFlowNetwork(Network):
+
+    def update_latency(self, fleet):
+
+        # get new self.traffic counts
+        self.traffic_count = fleet.traffic_count(self.num_edges)
+
+        # the latency moves the cars but is not used for routing
+        flow = self._counts_to_flow(self.traffic_count)
+        self.latency = self._flow_to_latency(flow)
+        self.edge_utilization = flow.reshape(1, self.num_edges)
+
+        return None
+
+    def _routing_tables(self):
+
+        # routing tables of the free flow travel times, computed on first use
+        if self.predecessor_matrix is None:
+            self.min_distance_matrix, self.predecessor_matrix = self._update_predecessor_matrix(
+                np.asarray(self.free_flow_time))
+
+        return self.min_distance_matrix, self.predecessor_matrix
+
+    def refresh_due(self, latency):
+        # the free flow tables never change, there is no refresh to make or count
+        return False
+
+    def compute_routing_tables(self, latency, origins=None):
+        # the free flow tables are kept for the whole run
+        return self._routing_tables()
+
+    def publish_routing_tables(self, tables):
+        # the tables and the cached routes never change
+        return None
@@ -1,4 +1,5 @@
-from simulation import Simulation
+from sweep import run_sweep
+import argparse
 import shutil
 
 """
@@ -27,35 +28,30 @@ Compare DP network with non-noisy version for
 - varying traffic demand (three demand scenarios)
 """
 
-for eps in [0.01, 0.1, 0.25, 0.5]:
+if __name__ == '__main__':
 
-    # plan to overwrite any saved results
-    folder = 'results/eps' + str(eps)
-    try:
-        shutil.rmtree(folder)
-    except:
-        pass
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='number of worker processes')
+    parser.add_argument('--csv', action='store_true', help='also export the results as csv files')
+    parser.add_argument('--recompute', action='store_true', help='clear the result cache and rerun every cell')
+    args = parser.parse_args()
 
-    # create a new folder
-    os.mkdir(folder)
+    eps_values = [0.01, 0.1, 0.25, 0.5]
+    demand_scenarios = ['baseline', 'low', 'high']
+
+    # completed cells (and the non-private trajectories) are cached by configuration and code version,
+    # a rerun only simulates the cells that changed or did not complete
+    cache_dir = 'results/cache'
+    if args.recompute:
+        shutil.rmtree(cache_dir, ignore_errors=True)
 
     print('-------------------------------------')
-    print('------------Epsilon %.2f ------------' % eps)
+    print('---- Running %d simulations on %d workers ----' % (len(eps_values) * len(demand_scenarios), args.workers))
     print('-------------------------------------')
 
-    for demand in ['baseline', 'low', 'high']:
-
-        ####################################################
-        #  Main Experiment
-        ####################################################
-
-        print('\n')
-        print('----- %s demand simulation -----' % demand)
-
-        # Path for results
-        name = folder + '/' + demand + '_demand'
-
-        sim = Simulation(demand_scenario=demand, eps=eps, fname=name)  # Initialize
-        sim.run()  # Run simulation
-        sim.save_summary_stats()  # Save results
+    ####################################################
+    #  Main Experiment
+    ####################################################
 
+    run_sweep(eps_values=eps_values, demand_scenarios=demand_scenarios, num_workers=args.workers,
+              export_csv=args.csv, cache_dir=cache_dir)
@@ -1,47 +1,63 @@
 import numpy as np
+from scipy.sparse import csr_matrix
 from scipy.sparse.csgraph import shortest_path
-import pandas as pd
+
+from counts_to_flow import CountsToFlow
+from network_data import load_network_data
+from routing import IncrementalShortestPaths, LazyShortestPaths
 
 
 class Network:
 
-    def __init__(self, capacity_scenario=None):
+    def __init__(self, capacity_scenario=None, lazy_routing=False, counts_to_flow=None, city='SiouxFalls',
+                 incremental_routing=False):
 
-        self.city = 'SiouxFalls'
+        self.city = city
 
         self.capacity_scenario = capacity_scenario
 
-        self.df_edges = pd.read_csv("Locations/" + self.city + "/edges.csv")
-        self.df_vertices = pd.read_csv("Locations/" + self.city + "/vertices.csv")
+        # compute shortest paths only for queried origins instead of all pairs
+        self.lazy_routing = lazy_routing
+
+        # read-only network data shared by all networks of the city
+        self.data = load_network_data(self.city)
 
-        self.num_edges = self.df_edges.shape[0]
-        self.num_vertices = self.df_vertices.shape[0]
+        self.num_edges = self.data.num_edges
+        self.num_vertices = self.data.num_vertices
 
         # max speed is in km/hr in the dataset. Converting to m/s
-        self.edge_max_speed = (self.df_edges['speed'] * 1000 / 3600).to_list()
-        self.edge_distance = self.df_edges['length'].to_list()
+        self.edge_max_speed = (self.data.edge_speed * 1000 / 3600).astype(float)
+        self.edge_distance = self.data.edge_length.astype(float)
 
         """
         The edge flow capacity presented in the dataset is 0.1 the flow capacity of the whole day
         Thus, the 2.4 division is edge flow capacity for a day.
         The subsequent division by 3600 is edge flow capacity per second
         """
-        self.edge_flow_capacity = (self.df_edges['capacity'] / 2.4 / 3600).to_list()
+        self.edge_flow_capacity = (self.data.edge_capacity / 2.4 / 3600).astype(float)
 
-        self.critical_counts = [self.edge_flow_capacity[i] * self.edge_distance[i] / self.edge_max_speed[i]
-                                for i in range(self.num_edges)]
+        # free flow travel time (sec) and critical counts of each edge
+        self.free_flow_time = self.edge_distance / self.edge_max_speed
+        self.critical_counts = self.edge_flow_capacity * self.edge_distance / self.edge_max_speed
 
         # load mapping from counts to flow
-        _, self.x_star = np.load('counts2flow_LUT_ymax200.npy')
+        self.counts_to_flow = CountsToFlow.load(mmap_mode='r') if counts_to_flow is None else counts_to_flow
+
+        # tail and head vertex of each edge
+        self.edge_tail = self.data.edge_tail
+        self.edge_head = self.data.edge_head
 
-        # Dictionary with key (origin, destination) and value as edge index
-        self.nodes_to_edge = self._compute_nodes_to_edge()
+        # Sparse graph used for routing. The sparsity pattern is fixed, only the edge weights change
+        self.graph_edge_order = self.data.graph_edge_order
+        self.graph = csr_matrix((self.free_flow_time[self.graph_edge_order],
+                                 self.data.graph_indices, self.data.graph_indptr),
+                                shape=(self.num_vertices, self.num_vertices))
 
         # Current traffic state of the network
         self.traffic_count = np.zeros(self.num_edges)  # zero cars on all edges
 
         # Latency of network. Current value will be updated
-        self.latency = [self.edge_distance[e]/self.edge_max_speed[e] for e in range(self.num_edges)]
+        self.latency = self.free_flow_time.copy()
 
         # track link utilization
         self.edge_utilization = np.zeros((1, self.num_edges))
@@ -50,14 +66,42 @@ class Network:
         self.predecessor_matrix = None
         self.min_distance_matrix = None
 
-    def _compute_nodes_to_edge(self):
-        n2e = {}
-        for i in range(self.num_edges):
-            orig = int(self.df_edges.iloc[i]['edge_tail'])
-            dest = int(self.df_edges.iloc[i]['edge_head'])
-            n2e[(orig, dest)] = i
+        # routes for each (origin, destination) within the current latency epoch
+        self.route_cache = {}
+
+        # the routing tables are computed and published by a RoutingBuffer instead of at every latency update
+        self.deferred_routing = False
+
+        # RefreshPolicy that skips the routing updates while the latency did not drift, None refreshes at every update
+        self.refresh_policy = None
+
+        # cumulative routing counters: route queries, routes extracted from the tables, single source shortest paths,
+        # table updates computed from scratch and from the changed edges, refreshes of the tables and skipped ones
+        self.routing_stats = {'route_queries': 0, 'routes_computed': 0, 'dijkstra_runs': 0,
+                              'full_updates': 0, 'incremental_updates': 0, 'refreshes': 0, 'skipped_refreshes': 0}
+
+        # update the routing tables from the edges whose latency changed since the previous tables
+        self.incremental_routing = incremental_routing
+        self.incremental_paths = None
+        if self.incremental_routing:
+            self.incremental_paths = IncrementalShortestPaths(self.graph, lazy=self.lazy_routing,
+                                                              stats=self.routing_stats)
+
+    def edges_between(self, tails, heads):
+        """
+        Return the index of the edges from tails to heads (arrays of vertices)
+        """
+        keys = np.asarray(tails, dtype=np.int64) * self.num_vertices + np.asarray(heads, dtype=np.int64)
+        return self.graph_edge_order[np.searchsorted(self.data.graph_edge_keys, keys)]
 
-        return n2e
+    def _counts_to_flow(self, traffic_count):
+        """
+        Input: Traffic count on each link
+        Return: normalized flow x_star on each link, looked up from the counts-to-flow table
+        Counts beyond the range of the table are solved directly
+        """
+        y_hat = np.asarray(traffic_count, dtype=float) / self.critical_counts
+        return self.counts_to_flow(y_hat)
 
     def _counts_to_latency(self, traffic_count):
         """
@@ -65,90 +109,122 @@ class Network:
         Return: latency array
         Formula: Refer to paper for details
         """
-        b = 0.15
-        latency = []
+        return self._flow_to_latency(self._counts_to_flow(traffic_count))
 
-        for e in range(self.num_edges):
-
-            y_hat = traffic_count[e] / (self.edge_flow_capacity[e] * self.edge_distance[e] / self.edge_max_speed[e])
-            j = int(y_hat * 1e3)
-            a = self.edge_distance[e] / self.edge_max_speed[e]
-            latency.append(a * (1 + b * (self.x_star[j]) ** 4))
-
-        return latency
+    def _flow_to_latency(self, flow):
+        b = 0.15
+        return self.free_flow_time * (1 + b * flow ** 4)
 
     def _path_from_predecessor(self, origin, destination, predecessor_matrix):
 
-        # Extract the shortest path in terns of the vertex sequence
+        # Extract the shortest path in terns of the vertex sequence (walking back from the destination)
         vertex_path = [destination]
         current = destination
         while current != origin:
             pre = predecessor_matrix[origin, current]
-            vertex_path.insert(0, pre)
+            vertex_path.append(pre)
             current = pre
+        vertex_path.reverse()
 
         # Extract edge sequence from vertex sequence
-        edge_path = []
-        for i in range(len(vertex_path) - 1):
-            od = (vertex_path[i], vertex_path[i + 1])
-            edge_path.append(self.nodes_to_edge[od])
+        edge_path = self.edges_between(vertex_path[:-1], vertex_path[1:]).tolist()
 
         return edge_path
 
-    def shortest_path(self, origin, destination):
+    def _routing_tables(self):
 
         # Cautionary check if predecessor matrix is not initialized
         if self.predecessor_matrix is None:
             self.min_distance_matrix, self.predecessor_matrix = self._update_predecessor_matrix(self.latency)
 
-        edge_path = self._path_from_predecessor(origin, destination, self.predecessor_matrix)
+        return self.min_distance_matrix, self.predecessor_matrix
 
-        return edge_path
+    def route(self, origin, destination):
+        """
+        Return the shortest path (tuple of edge indices) and its estimated travel time
+        Routes are shared by all cars with the same OD pair and cached until the next latency update
+        """
+        od = (origin, destination)
+        self.routing_stats['route_queries'] += 1
+        if od not in self.route_cache:
+            self.routing_stats['routes_computed'] += 1
+            dist, pre = self._routing_tables()
+            edge_path = tuple(self._path_from_predecessor(origin, destination, pre))
+            self.route_cache[od] = (edge_path, dist[origin, destination])
 
-    def update_latency(self, cars):
+        return self.route_cache[od]
+
+    def shortest_path(self, origin, destination):
+        return self.route(origin, destination)[0]
+
+    def update_latency(self, fleet):
 
         # get new self.traffic counts
-        self.traffic_count = np.zeros(self.num_edges)
-        for car in cars:
-            current_edge = car.current_edge
-            self.traffic_count[current_edge] += 1
+        self.traffic_count = fleet.traffic_count(self.num_edges)
 
-        # call the counts to latency function
-        self.latency = self._counts_to_latency(self.traffic_count)
+        # call the counts to latency function, the flow is shared with the link utilization
+        flow = self._counts_to_flow(self.traffic_count)
+        self.latency = self._flow_to_latency(flow)
 
         # update predecessor matrix that stores the shortest paths
-        self.min_distance_matrix, self.predecessor_matrix = self._update_predecessor_matrix(self.latency)
+        if not self.deferred_routing and self.refresh_due(self.routing_latency()):
+            self.publish_routing_tables(self.compute_routing_tables(self.routing_latency()))
 
         # update link utilization
-        self.edge_utilization = self._compute_edge_utilization(self.traffic_count)
+        self.edge_utilization = flow.reshape(1, self.num_edges)
+
+        return None
+
+    def routing_latency(self):
+        # latency estimate the routes are computed on
+        return self.latency
 
+    def refresh_due(self, latency):
+        # whether the routing tables of a new routing latency should be computed
+        return self.refresh_policy is None or self.refresh_policy.due(latency)
+
+    def compute_routing_tables(self, latency, origins=None):
+        """
+        Return the shortest path tables of a latency estimate, without changing the tables used for routing
+        In lazy routing mode, the rows of origins are computed now instead of at their first route query
+        """
+        dist, pre = self._update_predecessor_matrix(latency)
+        if self.lazy_routing and origins is not None:
+            pre.paths.compute_rows(origins)
+        return dist, pre
+
+    def publish_routing_tables(self, tables):
+        # route the next cars on the given tables, the routes of the previous tables are discarded
+        self.min_distance_matrix, self.predecessor_matrix = tables
+        self.route_cache = {}
         return None
 
     def _update_predecessor_matrix(self, latency):
         """
         use the current latency estimates to update the predecessor matrix
+        In lazy routing mode, the returned matrices compute the row of an origin on first access
         """
 
-        # set up adjacency matrix
-        adj = np.zeros((self.num_vertices, self.num_vertices))
-        for i in range(self.num_edges):
-            orig = int(self.df_edges.iloc[i]['edge_tail'])
-            dest = int(self.df_edges.iloc[i]['edge_head'])
-            adj[orig, dest] = latency[i]
+        weights = np.asarray(latency, dtype=float)[self.graph_edge_order]
+
+        if self.incremental_paths is not None:
+            return self.incremental_paths.update(weights)
+
+        if self.lazy_routing:
+            # the lazy table keeps its own weights since the graph is shared between latency estimates
+            graph = csr_matrix((weights, self.graph.indices, self.graph.indptr), shape=self.graph.shape)
+            paths = LazyShortestPaths(graph, stats=self.routing_stats)
+            return paths.distance_matrix, paths.predecessor_matrix
+
+        # overwrite the edge weights of the graph in place
+        self.graph.data[:] = weights
 
         # compute the shortest paths
-        dist, pre = shortest_path(adj, directed=True, return_predecessors=True)
+        dist, pre = shortest_path(self.graph, directed=True, return_predecessors=True)
+        self.routing_stats['dijkstra_runs'] += self.num_vertices  # all pairs, counted as one run per origin
 
         return dist, pre
 
-    def _compute_edge_utilization(self, traffic):
-        edge_utilization = np.zeros((1, self.num_edges))
-        for e in range(self.num_edges):
-            y_hat = traffic[e] / (self.edge_flow_capacity[e] * self.edge_distance[e] / self.edge_max_speed[e])
-            j = int(y_hat * 1e3)  # Update if the counts to flow datafile changes
-            edge_utilization[0, e] = self.x_star[j]
-        return edge_utilization
-
     def edge_length(self, edge_index):
         return self.edge_distance[edge_index]
 
@@ -156,15 +232,11 @@ class Network:
         return self.edge_distance[edge_index] / self.latency[edge_index]
 
     def estimate_travel_time(self, origin, destination):
-        path = self.shortest_path(origin, destination)
-        tt = 0
-        for edge_index in path:
-            tt += self.latency[edge_index]
-        return tt
+        return self.route(origin, destination)[1]
 
     def edge_capacity_list(self):
-        return self.edge_flow_capacity
+        return self.edge_flow_capacity.tolist()
 
     def critical_counts_list(self):
-        return self.critical_counts
+        return self.critical_counts.tolist()
 
@@ -0,0 +1,113 @@
+"""
+Compiled, read-only network data of a city
+
+The csv files in Locations/<city>/ are compiled once into binary .npy arrays in Locations/<city>/compiled/
+(edge arrays, CSR topology and OD table). The arrays are opened with mmap_mode so that all networks and
+worker processes share the same read-only pages. The artifact is rebuilt when a csv file changes.
+"""
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+SOURCE_FILES = ['edges.csv', 'vertices.csv', 'od.csv']
+
+# loaded network data in this process, key: compiled folder, value: (source signature, NetworkData)
+_loaded = {}
+
+
+def _source_signature(city_dir):
+    # size and modification time of the source files
+    signature = {}
+    for name in SOURCE_FILES:
+        stat = os.stat(os.path.join(city_dir, name))
+        signature[name] = [stat.st_size, stat.st_mtime_ns]
+    return signature
+
+
+def compile_network(city_dir, compiled_dir, signature):
+    """
+    Compile the csv files of city_dir into .npy arrays in compiled_dir
+    """
+    df_edges = pd.read_csv(os.path.join(city_dir, 'edges.csv'))
+    df_vertices = pd.read_csv(os.path.join(city_dir, 'vertices.csv'))
+    df_od = pd.read_csv(os.path.join(city_dir, 'od.csv'))
+
+    num_vertices = df_vertices.shape[0]
+    edge_tail = df_edges['edge_tail'].to_numpy(dtype=np.int64)
+    edge_head = df_edges['edge_head'].to_numpy(dtype=np.int64)
+
+    # CSR topology, edges sorted by (tail, head)
+    graph_edge_order = np.lexsort((edge_head, edge_tail))
+    graph_indptr = np.zeros(num_vertices + 1, dtype=np.int32)
+    np.cumsum(np.bincount(edge_tail, minlength=num_vertices), out=graph_indptr[1:])
+    graph_indices = edge_head[graph_edge_order].astype(np.int32)
+
+    arrays = {'edge_tail': edge_tail,
+              'edge_head': edge_head,
+              'edge_length': df_edges['length'].to_numpy(),
+              'edge_capacity': df_edges['capacity'].to_numpy(),
+              'edge_speed': df_edges['speed'].to_numpy(),
+              'vertex_xcoord': df_vertices['xcoord'].to_numpy(dtype=float),
+              'vertex_ycoord': df_vertices['ycoord'].to_numpy(dtype=float),
+              'graph_indptr': graph_indptr,
+              'graph_indices': graph_indices,
+              'graph_edge_order': graph_edge_order,
+              'graph_edge_keys': edge_tail[graph_edge_order] * num_vertices + edge_head[graph_edge_order],
+              'od_origin': df_od['origin'].to_numpy(dtype=np.int64),
+              'od_destination': df_od['destination'].to_numpy(dtype=np.int64),
+              'od_volume': df_od['volume'].to_numpy()}
+
+    # write each file through a temporary file so that readers never see a partial artifact
+    os.makedirs(compiled_dir, exist_ok=True)
+    for name, values in arrays.items():
+        tmp_path = os.path.join(compiled_dir, '%s.%d.tmp.npy' % (name, os.getpid()))
+        np.save(tmp_path, values)
+        os.replace(tmp_path, os.path.join(compiled_dir, name + '.npy'))
+
+    # the manifest is written last and marks the artifact as complete
+    tmp_path = os.path.join(compiled_dir, 'manifest.%d.tmp' % os.getpid())
+    with open(tmp_path, 'w') as f:
+        json.dump({'sources': signature, 'arrays': list(arrays)}, f)
+    os.replace(tmp_path, os.path.join(compiled_dir, 'manifest.json'))
+
+    return None
+
+
+class NetworkData:
+
+    def __init__(self, compiled_dir, names):
+        for name in names:
+            setattr(self, name, np.load(os.path.join(compiled_dir, name + '.npy'), mmap_mode='r'))
+
+        self.num_vertices = self.vertex_xcoord.shape[0]
+        self.num_edges = self.edge_tail.shape[0]
+
+
+def load_network_data(city, locations_dir='Locations'):
+    """
+    Return the memory-mapped network data of a city, compiling it first if needed
+    """
+    city_dir = os.path.join(locations_dir, city)
+    compiled_dir = os.path.join(city_dir, 'compiled')
+    signature = _source_signature(city_dir)
+
+    if compiled_dir in _loaded and _loaded[compiled_dir][0] == signature:
+        return _loaded[compiled_dir][1]
+
+    manifest_path = os.path.join(compiled_dir, 'manifest.json')
+    manifest = None
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+
+    if manifest is None or manifest['sources'] != signature:
+        compile_network(city_dir, compiled_dir, signature)
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+
+    data = NetworkData(compiled_dir, manifest['arrays'])
+    _loaded[compiled_dir] = (signature, data)
+
+    return data
@@ -0,0 +1,142 @@
+"""
+Synthetic road networks for scale testing
+
+Generates grid or random planar (Delaunay triangulation of random points) networks with an OD table and
+writes them to Locations/<name>/ in the same edges.csv / vertices.csv / od.csv schema as SiouxFalls.
+All roads are two-way. Lengths are in m, capacities and speeds are in the ranges of SiouxFalls.
+
+The all-pairs routing tables have num_vertices^2 entries. lazy_routing=True only computes the rows of the
+origins routed in a latency epoch, but it still keeps one row (12 bytes per vertex) for each of them. With the
+default OD table (2 pairs per vertex) nearly every vertex is an origin, so this is as costly as all pairs. For
+networks beyond a few thousand vertices, draw the origins from a subset of vertices with num_origins, and
+memory and Dijkstra work per update then scale with num_origins x num_vertices.
+
+Example: `python network_generator.py grid 10000 --name Grid10k --num-origins 200`
+         `Simulation(demand_scenario='baseline', lazy_routing=True, city='Grid10k')`
+"""
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+from scipy.spatial import Delaunay
+
+CAPACITIES = [4958, 5109, 14565, 25900]  # typical edge capacities of SiouxFalls
+SPEED = 97  # km/hr
+
+
+def grid_network(num_vertices, spacing=1000):
+    """
+    Square grid with roads between horizontal and vertical neighbours
+    Return vertex coordinates (V, 2) and undirected edges (tail, head)
+    """
+    side = int(np.ceil(np.sqrt(num_vertices)))
+    vertex = np.arange(side * side).reshape(side, side)
+    coordinates = np.column_stack([(vertex % side).ravel(), (vertex // side).ravel()]) * float(spacing)
+
+    tails = np.concatenate([vertex[:, :-1].ravel(), vertex[:-1, :].ravel()])
+    heads = np.concatenate([vertex[:, 1:].ravel(), vertex[1:, :].ravel()])
+
+    return coordinates, tails, heads
+
+
+def planar_network(num_vertices, spacing=1000, rng=None):
+    """
+    Delaunay triangulation of random points, with on average `spacing` m between neighbouring vertices
+    Return vertex coordinates (V, 2) and undirected edges (tail, head)
+    """
+    rng = np.random.default_rng() if rng is None else rng
+    side = spacing * np.sqrt(num_vertices)
+    coordinates = rng.uniform(0, side, size=(num_vertices, 2))
+
+    # unique sides of the triangles
+    simplices = Delaunay(coordinates).simplices.astype(np.int64)
+    tails = simplices.ravel()
+    heads = simplices[:, [1, 2, 0]].ravel()
+    keys = np.unique(np.minimum(tails, heads) * num_vertices + np.maximum(tails, heads))
+
+    return coordinates, keys // num_vertices, keys % num_vertices
+
+
+def od_table(num_vertices, num_od, rng, num_origins=None):
+    """
+    Random distinct OD pairs with origin != destination and volumes in the range of SiouxFalls
+    With num_origins, the origins are drawn from a random subset of num_origins vertices
+    """
+    if num_origins is None or num_origins >= num_vertices:
+        origins = np.arange(num_vertices)
+    else:
+        origins = np.sort(rng.choice(num_vertices, size=num_origins, replace=False))
+    num_od = min(num_od, origins.shape[0] * (num_vertices - 1))
+    keys = np.zeros(0, dtype=np.int64)
+    while keys.shape[0] < num_od:
+        origin = origins[rng.integers(origins.shape[0], size=2 * num_od)]
+        destination = rng.integers(num_vertices, size=2 * num_od)
+        new_keys = origin[origin != destination] * num_vertices + destination[origin != destination]
+        keys = np.unique(np.concatenate([keys, new_keys]))
+    keys = rng.permutation(keys)[:num_od]
+    keys.sort()
+
+    return pd.DataFrame({'origin': keys // num_vertices,
+                         'destination': keys % num_vertices,
+                         'volume': 100 * rng.integers(1, 11, size=num_od)})
+
+
+def generate_network(kind, num_vertices, name, num_od=None, spacing=1000, seed=1729, locations_dir='Locations',
+                     num_origins=None):
+    """
+    Generate a network and write its csv files to locations_dir/name/
+    num_od is the number of OD pairs, 2 per vertex by default, num_origins the number of vertices they start from
+    """
+    rng = np.random.default_rng(seed)
+
+    if kind == 'grid':
+        coordinates, tails, heads = grid_network(num_vertices, spacing=spacing)
+    elif kind == 'planar':
+        coordinates, tails, heads = planar_network(num_vertices, spacing=spacing, rng=rng)
+    else:
+        raise ValueError('Unknown network kind %s' % kind)
+    num_vertices = coordinates.shape[0]
+
+    # two-way roads, the capacity and length are the same in both directions
+    length = np.maximum(np.rint(np.linalg.norm(coordinates[tails] - coordinates[heads], axis=1)), 1).astype(int)
+    capacity = rng.choice(CAPACITIES, size=tails.shape[0])
+    df_edges = pd.DataFrame({'edge_tail': np.concatenate([tails, heads]),
+                             'edge_head': np.concatenate([heads, tails]),
+                             'length': np.tile(length, 2),
+                             'capacity': np.tile(capacity, 2),
+                             'speed': SPEED})
+    df_edges = df_edges.sort_values(['edge_tail', 'edge_head'], ignore_index=True)
+
+    df_vertices = pd.DataFrame({'vert_id': np.arange(num_vertices),
+                                'xcoord': coordinates[:, 0],
+                                'ycoord': coordinates[:, 1]})
+
+    df_od = od_table(num_vertices, 2 * num_vertices if num_od is None else num_od, rng, num_origins=num_origins)
+
+    city_dir = os.path.join(locations_dir, name)
+    os.makedirs(city_dir, exist_ok=True)
+    df_edges.to_csv(os.path.join(city_dir, 'edges.csv'), index=False)
+    df_vertices.to_csv(os.path.join(city_dir, 'vertices.csv'), index=False)
+    df_od.to_csv(os.path.join(city_dir, 'od.csv'), index=False)
+
+    return city_dir
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Generate a synthetic road network for scale testing')
+    parser.add_argument('kind', choices=['grid', 'planar'])
+    parser.add_argument('num_vertices', type=int)
+    parser.add_argument('--name', default=None, help='name of the network in Locations/')
+    parser.add_argument('--num-od', type=int, default=None, help='number of OD pairs, default 2 per vertex')
+    parser.add_argument('--num-origins', type=int, default=None,
+                        help='number of vertices the OD pairs start from, default all vertices')
+    parser.add_argument('--spacing', type=float, default=1000, help='distance between neighbouring vertices (m)')
+    parser.add_argument('--seed', type=int, default=1729)
+    args = parser.parse_args()
+
+    name = args.name if args.name is not None else '%s%d' % (args.kind.capitalize(), args.num_vertices)
+    city_dir = generate_network(args.kind, args.num_vertices, name, num_od=args.num_od, spacing=args.spacing,
+                                seed=args.seed, num_origins=args.num_origins)
+    print('Network written to %s' % city_dir)
@@ -1,8 +1,9 @@
 import matplotlib.pyplot as plt
-import pandas as pd
 import numpy as np
 import os
 
+from results_store import load_run
+
 """
 Overview of the main results from the experiments:
 
@@ -25,7 +26,7 @@ Result # 1: Capacities on most links are large enough to fall into our analysis
 """
 plt.rcParams.update({'font.size': 10})
 
-df_counts = pd.read_csv(data_path + 'baseline_demand_critical_counts.csv')
+df_counts = load_run(data_path + 'baseline_demand').table('critical_counts')
 c = (df_counts['counts']).to_list()
 count, bins_count = np.histogram(c, bins=500)
 
@@ -125,14 +126,12 @@ for eps in [0.01, 0.1, 0.25, 0.5]:
 
     for demand in ['baseline', 'low', 'high']:
 
-        path = folder + '/' + demand + '_demand.csv'
-        df_results = pd.read_csv(path)
-
-        path = folder + '/' + demand + '_demand_array_utilization.csv'
-        utilization_array = np.loadtxt(path, delimiter=',')
-
-        path = folder + '/' + demand + '_demand_lambda.csv'
-        df_lambda = pd.read_csv(path)
+        # load only the columns used by the summary, from the results store or the csv files
+        results = load_run(folder + '/' + demand + '_demand')
+        df_results = results.table('car_stats', columns=['tt', 'dp_tt', 'dp_induced_excess_tt', 'path_similarity'])
+        utilization_array = results.utilization()
+        df_lambda = results.table('lambda')
+        results.close()
 
         path = folder + '/' + demand + '_demand_summary.csv'
         summarize_results(path, df_results=df_results, utilization_array=utilization_array, df_lambda=df_lambda)
@@ -0,0 +1,48 @@
+"""
+Routing policy simulated in lockstep with the other policies of a Simulation
+
+A policy is a router: a network object that provides update_latency(fleet), which refreshes the true latency
+used to move the cars and the information used for routing, and route(origin, destination), which returns the
+route and the estimated travel time of a new car. Network (exact latency), DPNetwork (noisy latency) and
+FreeFlowNetwork (no traffic information) are routing policies.
+Every policy routes the same new cars (same ids) of the shared demand stream in its own fleet.
+A random router draws from the simulation rng in an optional draw_noise() method, which the simulation calls
+before the demand of a latency update step, and keeps the draws in next_noise until the update, so the policies can
+be advanced in child processes with the draws of the main process.
+"""
+from fleet import Fleet
+
+
+class RoutingPolicy:
+
+    def __init__(self, name=None, network=None):
+        self.name = name
+        self.network = network  # router and road network of the policy
+        self.fleet = Fleet()  # cars routed by the policy
+        self.engine = None  # engine that moves the fleet during a run
+        self.routing = None  # RoutingBuffer of the run if the routing tables are published with a lag
+        self.trip_stats = None  # trips paired with the trips of the reference policy during a run
+
+    def update_latency(self, t):
+        # update the latency at time step t and start the routing tables of the new latency
+        self.engine.update_latency(t)
+        if self.routing is not None:
+            self.routing.start(t)
+        return None
+
+    def publish_routing(self, t):
+        # route on the tables due at time step t
+        if self.routing is not None:
+            self.routing.publish(t)
+        return None
+
+    def draw_noise(self):
+        # random draws of the next latency update of the router, if any
+        if hasattr(self.network, 'draw_noise'):
+            self.network.draw_noise()
+        return None
+
+    def kind(self):
+        # description of the router, for the run configuration
+        return {'name': self.name, 'router': type(self.network).__name__,
+                'eps': getattr(self.network, 'epsilon', None)}
@@ -0,0 +1,147 @@
+"""
+Compared routing policies advanced in child processes
+
+The routing of the new cars and the movement of the fleet are mostly interpreted Python, threads of one process
+take turns on the GIL there, so a compared policy only runs at the same time as the reference in its own process.
+Each child is forked at the start of the run with a copy of the simulation and keeps the fleet, engine and routing
+tables of its policy. At every step the main process sends the demand, the id of its first car and the noise drawn
+from the simulation rng (next_noise of a random router) before the latency update, the child advances the policy
+and replies with the trips completed in the step, the route edges added to its fleet, the number of cars in transit,
+its routing counters and its profile row.
+In the main process the policy is a mirror: its fleet only holds the route edges and the completed trips, for the
+pairing of trips, its engine is the PolicyProcess and its network keeps the routing counters of the child.
+Forking needs the fork start method (Linux), with one free cpu per compared policy to gain wall time.
+"""
+import multiprocessing
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from profiler import NullProfiler, StepProfiler
+
+
+def serve(simulation, policy, connection):
+    """
+    Advance the policy on the steps sent by the main process, run in the forked child
+    """
+    # the phase times of the child are sent to the main process, its routing counters are read there
+    profiler = StepProfiler() if isinstance(simulation.profiler, StepProfiler) else NullProfiler()
+    simulation.profiler = profiler
+    if policy.routing is not None:
+        # the threads of the executor of the main process are not forked
+        policy.routing.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='routing')
+    fleet = policy.fleet
+
+    try:
+        while True:
+            message = connection.recv()
+            num_path_edges = fleet.num_path_edges
+            row = None
+            if message[0] == 'step':
+                _, t, new_demand, first_id, noise, update = message
+                if noise is not None:
+                    policy.network.next_noise = noise
+                simulation.traffic_generator.demand_first_id = first_id
+                profiler.begin(t, {policy.name: policy.network})
+                simulation._advance_policy(t, new_demand, policy, update)
+                row = profiler.step_row(policy.name)
+            else:
+                policy.engine.finish()
+
+            connection.send(('ok', fleet.drain_completed(), fleet.path_edges[num_path_edges:],
+                             policy.engine.num_in_transit(), policy.network.routing_stats, row))
+            if message[0] == 'finish':
+                break
+    except Exception:
+        connection.send(('error', traceback.format_exc()))
+    finally:
+        if policy.routing is not None:
+            policy.routing.executor.shutdown()
+        connection.close()
+
+    return None
+
+
+class PolicyProcess:
+
+    def __init__(self, simulation=None, policy=None):
+        self.policy = policy
+        self.num_active = policy.engine.num_in_transit()  # cars in transit in the child after the last step
+
+        context = multiprocessing.get_context('fork')
+        self.connection, child_connection = context.Pipe()
+        self.process = context.Process(target=serve, args=(simulation, policy, child_connection),
+                                       name='policy-' + policy.name, daemon=True)
+        self.process.start()
+        child_connection.close()
+
+        # the engine of the mirror policy only counts the cars in transit
+        policy.engine = self
+
+    def submit(self, t, new_demand, first_id, update):
+        # the noise of a latency update was drawn by the main process, it is used by the child only
+        noise = None
+        if update and getattr(self.policy.network, 'next_noise', None) is not None:
+            noise, self.policy.network.next_noise = self.policy.network.next_noise, None
+        self.connection.send(('step', t, new_demand, first_id, noise, update))
+        return None
+
+    def result(self):
+        """
+        Wait for the reply of the child and add its completed trips to the mirror fleet
+        Return the profile row of the step, None if the run is not profiled
+        """
+        reply = self.connection.recv()
+        if reply[0] == 'error':
+            self.process.join()
+            raise RuntimeError('Policy %s failed in its process\n%s' % (self.policy.name, reply[1]))
+
+        _, chunks, path_edges, self.num_active, routing_stats, row = reply
+        self.policy.fleet.add_copied(chunks, path_edges)
+        self.policy.network.routing_stats.update(routing_stats)
+        return row
+
+    def num_in_transit(self):
+        return self.num_active
+
+    def finish(self):
+        self.connection.send(('finish',))
+        self.result()
+        self.process.join()
+        self.connection.close()
+        return None
+
+    def terminate(self):
+        # stop the child of a failed run
+        if self.process.is_alive():
+            self.process.terminate()
+        self.process.join()
+        return None
+
+
+class PolicyProcesses:
+    """
+    Child processes of the compared policies of a run, they are stopped if the run fails
+    """
+
+    def __init__(self, simulation=None, policies=None):
+        self.processes = [PolicyProcess(simulation=simulation, policy=policy) for policy in policies]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        if exc_type is not None:
+            for process in self.processes:
+                process.terminate()
+        return False
+
+    def submit(self, t, new_demand, first_id, update):
+        for process in self.processes:
+            process.submit(t, new_demand, first_id, update)
+        return None
+
+    def results(self, profiler):
+        # barrier of the step, the phase times of the children are added to their rows of the profile
+        for process in self.processes:
+            profiler.merge(process.policy.name, process.result())
+        return None
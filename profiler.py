@@ -0,0 +1,148 @@
+"""
+Per-step timing and counters of a simulation run
+
+StepProfiler keeps one row per time step and network (non-DP and DP) with the wall time of each phase and counters
+of the step. Phases are timed as laps: the time since the previous lap of the step is added to a phase of a network,
+so a step is split without nested timers. The routing counters are the change of network.routing_stats in the step.
+Rows are kept in memory and, with a path, appended to a csv file every flush_interval steps.
+A network advanced in a child process is profiled there, its row of the step is merged in the main process, and the
+time the main process waits for the children is the barrier phase of the first network.
+NullProfiler has the same interface and does nothing, it is used when profiling is disabled.
+"""
+import os
+import time
+
+import pandas as pd
+
+
+class StepProfiler:
+
+    phases = ['demand', 'latency_update', 'spawn', 'move', 'log', 'barrier', 'trip_stats']
+    counters = ['cars_spawned', 'cars_moved', 'completed_trips', 'route_queries', 'routes_computed', 'dijkstra_runs',
+                'skipped_refreshes']
+    # read from network.routing_stats
+    routing_counters = ['route_queries', 'routes_computed', 'dijkstra_runs', 'skipped_refreshes']
+
+    def __init__(self, path=None, flush_interval=60):
+
+        self.path = path  # csv file the rows are streamed to, nothing is written if None
+        self.flush_interval = flush_interval  # number of steps between writes
+
+        self.rows = []  # all rows of the run
+        self.num_flushed = 0  # rows already written to disk
+        self.step_rows = {}  # rows of the current step, key: network name
+        self.networks = {}  # networks of the current step, key: network name
+        self.num_steps = 0
+        self.last = 0
+
+        # start a new profile file
+        if self.path is not None and os.path.exists(self.path):
+            os.remove(self.path)
+
+    def begin(self, t, networks):
+        """
+        Start the rows of time step t, networks is a dictionary of the profiled networks by name
+        """
+        self.networks = networks
+        self.step_rows = {}
+        for name, network in networks.items():
+            row = {'t': t, 'network': name}
+            row.update(dict.fromkeys(self.phases, 0.0))
+            row.update(dict.fromkeys(self.counters, 0))
+            for c in self.routing_counters:
+                row[c] = -network.routing_stats[c]
+            self.step_rows[name] = row
+        self.start()
+        return None
+
+    def start(self):
+        # start the laps of the current step
+        self.last = time.perf_counter()
+        return None
+
+    def lap(self, name, phase):
+        # add the time since the last lap to the phase of network name
+        now = time.perf_counter()
+        self.step_rows[name][phase] += now - self.last
+        self.last = now
+        return None
+
+    def count(self, name, counter, value):
+        self.step_rows[name][counter] += value
+        return None
+
+    def step_row(self, name):
+        # times and counters of network name in the current step, without the routing counters
+        row = self.step_rows[name]
+        return {c: row[c] for c in self.phases + self.counters if c not in self.routing_counters}
+
+    def merge(self, name, row):
+        # add the times and counters of a network advanced in another process to its row of the current step
+        for c, value in row.items():
+            self.step_rows[name][c] += value
+        return None
+
+    def end(self):
+        # close the rows of the step with the routing counters of each network
+        for name, row in self.step_rows.items():
+            for c in self.routing_counters:
+                row[c] += self.networks[name].routing_stats[c]
+            self.rows.append(row)
+        self.step_rows, self.networks = {}, {}
+        self.num_steps += 1
+
+        if self.num_steps % self.flush_interval == 0:
+            self.flush()
+
+        return None
+
+    def flush(self):
+        # append the rows not yet written to disk
+        if self.path is not None and len(self.rows) > self.num_flushed:
+            df = pd.DataFrame(self.rows[self.num_flushed:], columns=self.columns())
+            df.to_csv(self.path, mode='a', header=self.num_flushed == 0, index=False)
+        self.num_flushed = len(self.rows)
+        return None
+
+    def columns(self):
+        return ['t', 'network'] + self.phases + self.counters
+
+    def to_df(self):
+        return pd.DataFrame(self.rows, columns=self.columns())
+
+    def summary(self):
+        """
+        Total time and counts of each phase, per network
+        """
+        return self.to_df().drop(columns='t').groupby('network', sort=False).sum()
+
+    def close(self):
+        self.flush()
+        return None
+
+
+class NullProfiler:
+
+    def begin(self, t, networks):
+        return None
+
+    def start(self):
+        return None
+
+    def lap(self, name, phase):
+        return None
+
+    def count(self, name, counter, value):
+        return None
+
+    def step_row(self, name):
+        return None
+
+    def merge(self, name, row):
+        return None
+
+    def end(self):
+        return None
+
+    def close(self):
+        return None
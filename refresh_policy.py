@@ -0,0 +1,50 @@
+"""
+Event-triggered refresh of the routing tables
+
+At a latency update the routing tables are only recomputed once the routing latency drifted from the latency of
+the current tables: when the latency of an edge changed by more than threshold (relative change). The tables are
+refreshed anyway after max_skipped consecutive skipped refreshes, which bounds their staleness. The latency that
+moves the cars is updated at every latency update, a skipped refresh keeps the tables and the cached routes.
+"""
+import numpy as np
+
+
+class RefreshPolicy:
+
+    def __init__(self, threshold=0.05, max_skipped=None, stats=None):
+
+        self.threshold = threshold  # relative latency change of an edge that triggers a refresh
+        self.max_skipped = max_skipped  # maximum number of consecutive skipped refreshes, None for no bound
+
+        # routing counters of the network, refreshes and skipped refreshes are added to it
+        self.stats = stats
+
+        self.latency = None  # routing latency of the current tables
+        self.num_skipped = 0  # skipped refreshes since the last refresh
+        self.max_drift = 0.0  # drift of the last latency update
+
+    def due(self, latency):
+        """
+        Return whether the routing tables of latency should be computed, the current tables are kept otherwise
+        """
+        latency = np.asarray(latency, dtype=float)
+        stale = self.max_skipped is not None and self.num_skipped >= self.max_skipped
+        if self.latency is None:
+            self.max_drift = np.inf
+        else:
+            self.max_drift = float(np.max(np.abs(latency - self.latency) / self.latency))
+
+        if stale or self.max_drift > self.threshold:
+            self.latency = latency.copy()
+            self.num_skipped = 0
+            self._count('refreshes')
+            return True
+
+        self.num_skipped += 1
+        self._count('skipped_refreshes')
+        return False
+
+    def _count(self, name):
+        if self.stats is not None:
+            self.stats[name] += 1
+        return None
@@ -0,0 +1,189 @@
+"""
+Monte Carlo replications of the DP noise mechanism
+
+A single demand stream and a single non-private network are shared by R replicates of the DP network.
+The Laplace noise of all replicates is drawn as one (R, E) array and the noisy latencies are computed
+for all replicates together. Each replicate is a routing policy with its own routing tables and cars, it replaces
+the DP policy of Simulation. Only the stepped engine without routing lag, refresh policy or profiling is supported.
+"""
+import numpy as np
+import pandas as pd
+from alive_progress import alive_bar
+
+from dp_network import DPNetwork
+from engine import SteppedEngine
+from policy import RoutingPolicy
+from simulation import Simulation
+from trip_stats import TripStats
+
+
+class ReplicatedSimulation(Simulation):
+
+    def __init__(self, demand_scenario=None, capacity_scenario=None, eps=0.01, fname=None, lazy_routing=False,
+                 seed=1729, num_replicates=10, noise_seed=None, delta_t=10, multi_edge=False, city='SiouxFalls',
+                 incremental_routing=False):
+
+        Simulation.__init__(self, demand_scenario=demand_scenario, capacity_scenario=capacity_scenario, eps=eps,
+                            fname=fname, lazy_routing=lazy_routing, seed=seed, delta_t=delta_t,
+                            multi_edge=multi_edge, city=city, incremental_routing=incremental_routing)
+
+        self.eps = eps
+        self.num_replicates = num_replicates
+        self.noise_seed = seed if noise_seed is None else noise_seed
+
+        # noise of all replicates, independent of the demand stream
+        self.noise_rng = np.random.default_rng(self.noise_seed)
+
+        # one DP policy per replicate, in place of the DP policy of Simulation
+        self.dp_networks = [DPNetwork(eps=eps, capacity_scenario=capacity_scenario, lazy_routing=lazy_routing,
+                                      rng=self.noise_rng, city=city, incremental_routing=incremental_routing)
+                            for _ in range(num_replicates)]
+        self.policies = self.policies[:1] + [RoutingPolicy(name='dp%d' % r, network=dp_network)
+                                             for r, dp_network in enumerate(self.dp_networks)]
+        self.dp_fleets = [policy.fleet for policy in self.policies[1:]]
+        self.dp_network = self.dp_networks[0]
+        self.dp_cars = self.dp_fleets[0]
+        self.replicate_stats = []  # paired trip metrics of each replicate
+
+    def add_policy(self, name, network):
+        raise ValueError('ReplicatedSimulation only runs the DP replicates')
+
+    def _check_options(self):
+        # options of Simulation that the replicated run does not implement
+        unsupported = {'engine': self.engine != 'stepped', 'parallel': self.parallel,
+                       'routing_lag': self.routing_lag != 0, 'refresh_threshold': self.refresh_threshold is not None,
+                       'profile': self.profile, 'baseline_cache': self.baseline_cache is not None}
+        for option, is_set in unsupported.items():
+            if is_set:
+                raise ValueError('ReplicatedSimulation does not support %s' % option)
+        return None
+
+    def config(self):
+        config = Simulation.config(self)
+        config.update({'num_replicates': self.num_replicates, 'noise_seed': self.noise_seed})
+        return config
+
+    def _update_dp_latency(self):
+        """
+        Noisy counts and latencies of all replicates in one batch
+        """
+        num_edges = self.network.num_edges
+        edges = np.concatenate([fleet.current_edge + r * num_edges for r, fleet in enumerate(self.dp_fleets)])
+        counts = np.bincount(edges, minlength=self.num_replicates * num_edges).reshape(self.num_replicates, num_edges)
+        counts = counts.astype(float)
+
+        # compute noisy traffic counts
+        noise = self.noise_rng.laplace(scale=1 / self.eps, size=(self.num_replicates, num_edges))
+        dp_counts = np.maximum(counts + noise, 0)
+
+        # call the counts to latency function
+        latency = self.network._counts_to_latency(counts)
+        dp_latency = self.network._counts_to_latency(dp_counts)
+
+        for r, dp_network in enumerate(self.dp_networks):
+            dp_network.traffic_count = counts[r]
+            dp_network.set_noisy_latency(latency=latency[r], dp_traffic_counts=dp_counts[r],
+                                         dp_latency=dp_latency[r])
+
+        return None
+
+    def _in_transit(self):
+        return len(self.cars) > 0 or any(len(fleet) > 0 for fleet in self.dp_fleets)
+
+    def run(self):
+        self._check_options()
+
+        # Initializing run__log
+        self.run_log = self._new_run_log()
+
+        # the non-DP network (the reference policy) is moved by the stepped engine
+        self.car_engine = SteppedEngine(network=self.network, fleet=self.cars, delta_t=self.delta_t,
+                                        multi_edge=self.multi_edge)
+        self.policies[0].engine = self.car_engine
+
+        # the non-DP trips are paired with the trips of every replicate
+        self.replicate_stats = [TripStats(fleet=self.cars, dp_fleet=dp_fleet, trip_time=self._trip_time)
+                                for dp_fleet in self.dp_fleets]
+        self.trip_stats = self.replicate_stats[0]
+
+        # Looping through every time step for the simulation
+        t = 0
+        update_interval = self._update_interval()
+
+        with alive_bar(self.max_time, disable=not self.progress_bar) as bar:
+
+            # Run simulation for max_time and then wait till all cars reach destination
+            while t < self.max_time or self._in_transit():
+
+                if t < self.max_time:
+                    bar()
+
+                if t % update_interval == 0:
+                    self.network.update_latency(self.cars)  # update latency as a function of active cars
+                    self._update_dp_latency()  # update latency for all DP replicates
+
+                # generate demand that is shared by the non-DP network and all replicates
+                if t < self.max_time:
+                    new_demand = self.traffic_generator.new_demand()
+                else:
+                    new_demand = self.traffic_generator.no_demand()
+
+                # Routing for the non-DP network
+                self._update_run_log(self._step_network(t, new_demand))
+
+                # Routing in the DP replicates, the same cars (and ids) enter every replicate
+                for dp_network, dp_fleet in zip(self.dp_networks, self.dp_fleets):
+                    new_cars = self.traffic_generator.new_cars(start_time=t, network=dp_network,
+                                                               new_traffic=new_demand)
+                    dp_fleet.add(**new_cars)
+
+                    just_completed = dp_fleet.update_locations(network=dp_network, delta_t=self.delta_t,
+                                                               multi_edge=self.multi_edge)
+                    dp_fleet.remove_completed(just_completed)
+
+                # pair the completed trips
+                trips = self.cars.drain_completed()
+                for stats, dp_fleet in zip(self.replicate_stats, self.dp_fleets):
+                    stats.add(trips=trips, dp_trips=dp_fleet.drain_completed())
+
+                # increment time counter
+                t += 1
+
+        # write the remaining log and plot progress
+        self.run_log.close(plot=self.plot_log)
+        if self.results is not None:
+            self.results.write_metadata(self.metadata(num_steps=t))
+
+        return None
+
+    def replicate_summary_df(self):
+        """
+        Summary statistics of each replicate, one row per replicate
+        """
+        rows = []
+        for r, stats in enumerate(self.replicate_stats):
+            stat_df = stats.to_df()
+            rows.append({'replicate': r,
+                         'num_trips': stat_df.shape[0],
+                         'tt': stat_df['tt'].mean(),
+                         'dp_tt': stat_df['dp_tt'].mean(),
+                         'dp_induced_excess_tt': stat_df['dp_induced_excess_tt'].mean(),
+                         'dp_induced_excess_tt_percent':
+                             100 * (stat_df['dp_tt'].mean() - stat_df['tt'].mean()) / stat_df['tt'].mean(),
+                         'no_excess_tt_percent': 100 * (stat_df['dp_induced_excess_tt'] == 0).mean(),
+                         'same_route_percent': 100 * (stat_df['path_similarity'] == 1).mean(),
+                         'dp_tt_est_error': stat_df['dp_tt_est_error'].mean()})
+
+        return pd.DataFrame(rows)
+
+    def save_summary_stats(self):
+
+        # replicate specific stats
+        summary_df = self.replicate_summary_df()
+        self._save_table('replicates', '_replicates.csv', summary_df)
+
+        self._save_capacity()
+        self._save_demand()
+        self._save_critical_counts()
+
+        return None
@@ -0,0 +1,114 @@
+"""
+Content-addressed cache of completed simulation runs
+
+The key of a run is the hash of its configuration (Simulation.config), of the simulation code and of the
+network and counts-to-flow data it reads. A run is computed in a temporary folder and moved to
+<cache_dir>/<key>/ once it is complete, so an interrupted sweep leaves no entry and resumes with the runs
+that did not finish. Changing a parameter or the code only recomputes the runs whose key changed.
+"""
+import hashlib
+import json
+import os
+import shutil
+
+from counts_to_flow import DEFAULT_LUT
+from network_data import SOURCE_FILES
+
+# scripts of the repository that do not change the results of a simulation
+SCRIPTS = ['main.py', 'plots.py', 'benchmark.py', 'accuracy_report.py', 'network_generator.py', 'c_star.py']
+
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def _hash_files(paths):
+    digest = hashlib.sha256()
+    for path in paths:
+        digest.update(os.path.basename(path).encode())
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def code_version(package_dir=PACKAGE_DIR):
+    """
+    Hash of the simulation modules and of the counts-to-flow table
+    """
+    modules = sorted(name for name in os.listdir(package_dir) if name.endswith('.py') and name not in SCRIPTS)
+    return _hash_files([os.path.join(package_dir, name) for name in modules] + [os.path.join(package_dir, DEFAULT_LUT)])
+
+
+def network_version(city, locations_dir='Locations'):
+    # hash of the csv files of the network
+    return _hash_files([os.path.join(locations_dir, city, name) for name in SOURCE_FILES])
+
+
+def lut_version(package_dir=PACKAGE_DIR):
+    # hash of the counts-to-flow table
+    return _hash_files([os.path.join(package_dir, DEFAULT_LUT)])
+
+
+class ResultCache:
+
+    run_name = 'run'  # file prefix of the outputs in a cache entry
+
+    def __init__(self, cache_dir='results/cache', version=None):
+        self.cache_dir = cache_dir
+        self.version = code_version() if version is None else version  # code version of the keys
+        self.network_versions = {}
+
+    def key(self, config):
+        """
+        Cache key of a run configuration (dictionary of json serializable parameters)
+        """
+        city = config.get('city', 'SiouxFalls')
+        if city not in self.network_versions:
+            self.network_versions[city] = network_version(city)
+        content = dict(config, code_version=self.version, network_version=self.network_versions[city])
+        return hashlib.sha256(json.dumps(content, sort_keys=True).encode()).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    def contains(self, key):
+        # an entry is complete once its config file exists
+        return os.path.exists(os.path.join(self.path(key), 'config.json'))
+
+    def new_entry(self, key):
+        """
+        Return the prefix of the outputs of a new run, in a temporary folder of this process
+        """
+        tmp_dir = '%s.%d.tmp' % (self.path(key), os.getpid())
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        return os.path.join(tmp_dir, self.run_name)
+
+    def commit(self, key, fname, config):
+        """
+        Move the completed run with outputs fname (returned by new_entry) to its entry
+        """
+        tmp_dir = os.path.dirname(fname)
+        with open(os.path.join(tmp_dir, 'config.json'), 'w') as f:
+            json.dump(dict(config, code_version=self.version), f, indent=1)
+
+        try:
+            os.replace(tmp_dir, self.path(key))
+        except OSError:
+            # the same run was completed by another process
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+        return None
+
+    def restore(self, key, fname):
+        """
+        Copy the outputs of an entry to fname, e.g. run.npz to <fname>.npz
+        """
+        entry = self.path(key)
+        os.makedirs(os.path.dirname(fname) or '.', exist_ok=True)
+        for name in os.listdir(entry):
+            if name.startswith(self.run_name):
+                shutil.copyfile(os.path.join(entry, name), fname + name[len(self.run_name):])
+        return None
+
+    def baseline_cache(self):
+        # folder of the non-private trajectories, shared by the runs of the same code version
+        return os.path.join(self.cache_dir, 'baseline_' + self.version[:16])
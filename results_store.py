@@ -0,0 +1,164 @@
+"""
+Compressed, columnar store of the outputs of a simulation run
+
+All outputs of a run are members of one zip file (<fname>.npz) holding deflate-compressed .npy arrays:
+    - tables (car stats, capacity, lambda, critical counts, run log, ...) with one member per column
+    - the edge utilization time series, appended in chunks of rows while the simulation runs
+    - the run metadata as a json string
+np.load reads the members lazily, so a reader only decompresses the columns and utilization chunks it asks for.
+load_run falls back to the csv files of runs that were saved as csv, export_csv writes a store as csv files.
+"""
+import json
+import os
+import zipfile
+
+import numpy as np
+import pandas as pd
+
+
+class ResultsWriter:
+
+    def __init__(self, path):
+
+        self.path = path
+        self.utilization_rows = []  # number of rows of each utilization chunk
+
+        # start a new store
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        zipfile.ZipFile(self.path, mode='w').close()
+
+    def write(self, name, values):
+        # append one array to the store
+        with zipfile.ZipFile(self.path, mode='a', compression=zipfile.ZIP_DEFLATED) as zf:
+            with zf.open(name + '.npy', mode='w', force_zip64=True) as f:
+                np.lib.format.write_array(f, np.asarray(values), allow_pickle=False)
+        return None
+
+    def write_table(self, name, df):
+        # one member per column, the column names are kept in order, text columns are stored as strings
+        for i, c in enumerate(df.columns):
+            values = df[c].to_numpy()
+            self.write('%s/%d' % (name, i), values.astype(str) if values.dtype == object else values)
+        self.write(name + '/columns', np.array(df.columns, dtype=str))
+        return None
+
+    def append_utilization(self, rows):
+        self.write('utilization/%d' % len(self.utilization_rows), rows)
+        self.utilization_rows.append(rows.shape[0])
+        return None
+
+    def close_utilization(self):
+        # index of the utilization chunks, written once the time series is complete
+        self.write('utilization/rows', np.array(self.utilization_rows, dtype=np.int64))
+        return None
+
+    def write_metadata(self, metadata):
+        self.write('metadata', np.array(json.dumps(metadata)))
+        return None
+
+
+class RunResults:
+
+    def __init__(self, path):
+        self.path = path
+        self.data = np.load(path)  # lazy, members are decompressed on access
+
+    def tables(self):
+        return sorted(name[:-len('/columns')] for name in self.data.files if name.endswith('/columns'))
+
+    def table(self, name, columns=None):
+        """
+        Return the table as a DataFrame, with only the given columns if columns is not None
+        """
+        names = self.data[name + '/columns'].tolist()
+        columns = names if columns is None else columns
+        return pd.DataFrame({c: self.data['%s/%d' % (name, names.index(c))] for c in columns})
+
+    def utilization(self, start=None, stop=None):
+        """
+        Edge utilization of the time steps [start, stop), only the chunks that overlap the range are decompressed
+        """
+        if 'utilization/rows' in self.data.files:
+            rows = self.data['utilization/rows']
+        else:
+            # interrupted run, the chunks are read to find their length
+            num_chunks = sum(1 for name in self.data.files if name.startswith('utilization/'))
+            rows = np.array([self.data['utilization/%d' % k].shape[0] for k in range(num_chunks)], dtype=np.int64)
+        chunk_start = np.concatenate([[0], np.cumsum(rows)])
+
+        start = 0 if start is None else start
+        stop = chunk_start[-1] if stop is None else min(stop, chunk_start[-1])
+        chunks = [k for k in range(rows.shape[0]) if chunk_start[k] < stop and chunk_start[k + 1] > start]
+        if len(chunks) == 0:
+            return np.zeros((0, 0))
+
+        array = np.vstack([self.data['utilization/%d' % k] for k in chunks])
+        offset = chunk_start[chunks[0]]
+        return array[start - offset:stop - offset]
+
+    def metadata(self):
+        return json.loads(str(self.data['metadata'])) if 'metadata' in self.data.files else {}
+
+    def close(self):
+        self.data.close()
+        return None
+
+
+class CsvRunResults:
+    """
+    Same interface as RunResults for the outputs of a run saved as csv files
+    """
+
+    # table name and file suffix
+    suffixes = {'car_stats': '.csv',
+                'capacity': '_edgeflowcapacity.csv',
+                'critical_counts': '_critical_counts.csv',
+                'lambda': '_lambda.csv',
+                'replicates': '_replicates.csv',
+                'policies': '_policies.csv'}
+
+    def __init__(self, fname):
+        self.fname = fname
+
+    def tables(self):
+        return [name for name, suffix in self.suffixes.items() if os.path.exists(self.fname + suffix)]
+
+    def table(self, name, columns=None):
+        return pd.read_csv(self.fname + self.suffixes[name], usecols=columns)
+
+    def utilization(self, start=None, stop=None):
+        start = 0 if start is None else start
+        max_rows = None if stop is None else stop - start
+        return np.loadtxt(self.fname + '_array_utilization.csv', delimiter=',', ndmin=2, skiprows=start,
+                          max_rows=max_rows)
+
+    def metadata(self):
+        return {}
+
+    def close(self):
+        return None
+
+
+def export_csv(results, fname):
+    """
+    Write the tables and the utilization of results as the csv files of a run saved under fname
+    """
+    for name in results.tables():
+        if name in CsvRunResults.suffixes:
+            results.table(name).to_csv(fname + CsvRunResults.suffixes[name], index=False, sep=',')
+
+    with open(fname + '_array_utilization.csv', 'wb') as f:
+        utilization = results.utilization()
+        if utilization.shape[0] > 0:
+            np.savetxt(f, utilization, delimiter=",")
+
+    return None
+
+
+def load_run(fname):
+    """
+    Return the results of the run saved under fname (path without extension), from the store if it exists
+    """
+    if os.path.exists(fname + '.npz'):
+        return RunResults(fname + '.npz')
+    return CsvRunResults(fname)
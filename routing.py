@@ -0,0 +1,168 @@
+"""
+Shortest path tables used by the networks for routing
+
+LazyShortestPaths runs single source Dijkstra only for the origins that are queried.
+The rows are cached until the table is replaced at the next latency update.
+IncrementalShortestPaths updates the tables of the previous latency epoch from the edges whose weight changed:
+only the shortest path trees that can change are recomputed, the rows of the other origins are kept.
+"""
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import dijkstra, shortest_path
+
+
+class LazyShortestPaths:
+
+    def __init__(self, graph, stats=None):
+
+        # graph with the edge weights of this latency epoch
+        self.graph = graph
+
+        # routing counters of the network, the Dijkstra runs are added to stats['dijkstra_runs']
+        self.stats = stats
+
+        # cached shortest path rows for each queried origin
+        self.distance_rows = {}
+        self.predecessor_rows = {}
+
+        # number of single source shortest path computations
+        self.dijkstra_runs = 0
+
+        # matrix-like views so that lazy tables can be indexed as [origin, node]
+        self.distance_matrix = _RowView(self, self.distance_rows)
+        self.predecessor_matrix = _RowView(self, self.predecessor_rows)
+
+    def compute_rows(self, origins):
+        # rows of several origins in one Dijkstra call, e.g. ahead of their first route query
+        origins = [o for o in dict.fromkeys(int(o) for o in origins) if o not in self.predecessor_rows]
+        if len(origins) > 0:
+            dist, pre = dijkstra(self.graph, directed=True, indices=origins, return_predecessors=True)
+            for i, origin in enumerate(origins):
+                self.distance_rows[origin] = dist[i]
+                self.predecessor_rows[origin] = pre[i]
+            self.dijkstra_runs += len(origins)
+            if self.stats is not None:
+                self.stats['dijkstra_runs'] += len(origins)
+        return None
+
+    def compute(self, origin):
+        if origin not in self.predecessor_rows:
+            dist, pre = dijkstra(self.graph, directed=True, indices=origin, return_predecessors=True)
+            self.distance_rows[origin] = dist
+            self.predecessor_rows[origin] = pre
+            self.dijkstra_runs += 1
+            if self.stats is not None:
+                self.stats['dijkstra_runs'] += 1
+        return None
+
+
+class IncrementalShortestPaths:
+
+    def __init__(self, graph, lazy=False, max_changed_fraction=0.1, stats=None):
+
+        # graph with the edge weights of the current tables, the sparsity pattern is fixed
+        self.graph = graph.copy()
+        self.num_vertices = graph.shape[0]
+        self.tails = np.repeat(np.arange(self.num_vertices), np.diff(graph.indptr))  # tail vertex of each entry
+        self.heads = graph.indices
+
+        # rows are computed on first access (LazyShortestPaths) instead of for all origins
+        self.lazy = lazy
+
+        # the tables are recomputed from scratch if a larger fraction of the edges changed
+        self.max_changed_fraction = max_changed_fraction
+
+        # routing counters of the network, with the number of full and incremental updates
+        self.stats = stats
+
+        self.weights = None  # edge weights of the current tables, in the order of the graph entries
+        self.tables = None  # (distance, predecessor) arrays, or the LazyShortestPaths in lazy mode
+
+    def update(self, weights):
+        """
+        Return the distance and predecessor tables of the new edge weights (in the order of the graph entries)
+        The tables of the previous weights are not modified, they may still be used for routing
+        """
+        changed = None if self.weights is None else np.nonzero(weights != self.weights)[0]
+        if changed is None or changed.shape[0] > self.max_changed_fraction * weights.shape[0]:
+            self._count('full_updates')
+            self.tables = self._full(weights)
+        elif changed.shape[0] > 0:
+            self._count('incremental_updates')
+            self.tables = self._repair(weights, changed)
+        self.weights = weights.copy()
+
+        if self.lazy:
+            return self.tables.distance_matrix, self.tables.predecessor_matrix
+        return self.tables
+
+    def _full(self, weights):
+        if self.lazy:
+            return LazyShortestPaths(self._graph(weights), stats=self.stats)
+
+        self.graph.data[:] = weights
+        dist, pre = shortest_path(self.graph, directed=True, return_predecessors=True)
+        self._count('dijkstra_runs', self.num_vertices)
+        return dist, pre
+
+    def _repair(self, weights, changed):
+        if self.lazy:
+            # rows of the previous table that are still valid are carried over, the others are computed on access
+            paths = LazyShortestPaths(self._graph(weights), stats=self.stats)
+            origins = np.array(list(self.tables.predecessor_rows), dtype=np.int64)
+            if origins.shape[0] > 0:
+                dist = np.vstack([self.tables.distance_rows[o] for o in origins.tolist()])
+                pre = np.vstack([self.tables.predecessor_rows[o] for o in origins.tolist()])
+                for o in origins[~self._affected(dist, pre, weights, changed)].tolist():
+                    paths.distance_rows[o] = self.tables.distance_rows[o]
+                    paths.predecessor_rows[o] = self.tables.predecessor_rows[o]
+            return paths
+
+        dist, pre = self.tables
+        rows = np.nonzero(self._affected(dist, pre, weights, changed))[0]
+        dist, pre = dist.copy(), pre.copy()
+        self.graph.data[:] = weights
+        if rows.shape[0] > 0:
+            dist[rows], pre[rows] = dijkstra(self.graph, directed=True, indices=rows, return_predecessors=True)
+            self._count('dijkstra_runs', rows.shape[0])
+        return dist, pre
+
+    def _affected(self, dist, pre, weights, changed):
+        """
+        Return whether the shortest path tree of each row (origin) of dist and pre can change with the new weights
+        """
+        tails, heads = self.tails[changed], self.heads[changed]
+        new = weights[changed]
+        longer = new > self.weights[changed]
+
+        # a longer edge only changes the trees that use it
+        affected = np.any(pre[:, heads[longer]] == tails[longer], axis=1)
+
+        # a shorter edge changes the trees of the origins it brings a vertex closer to, on a tie the tree is kept
+        via = dist[:, tails[~longer]] + new[~longer]
+        affected |= np.any(via < dist[:, heads[~longer]], axis=1)
+
+        return affected
+
+    def _graph(self, weights):
+        # new graph for a lazy table, which keeps its weights while its rows are computed
+        return csr_matrix((weights, self.graph.indices, self.graph.indptr), shape=self.graph.shape)
+
+    def _count(self, name, value=1):
+        if self.stats is not None:
+            self.stats[name] += value
+        return None
+
+
+class _RowView:
+
+    def __init__(self, paths, rows):
+        self.paths = paths
+        self.rows = rows
+
+    def __getitem__(self, key):
+        origin, node = key
+        origin = int(origin)
+        if origin not in self.rows:
+            self.paths.compute(origin)
+        return self.rows[origin][node]
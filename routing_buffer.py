@@ -0,0 +1,61 @@
+"""
+Double-buffered routing tables computed in the background
+
+At a latency update the network measures the new latency at once, the cars keep moving on it, but the shortest
+path tables of that latency are computed in a background thread from a snapshot of the routing latency. Routes
+are served from the published tables until the new tables are published, lag time steps after the snapshot,
+which models the delay of publishing the routing information. The tables are swapped in one assignment between
+two routing queries, so every route of a step comes from the same tables.
+With lazy routing, the background task computes the rows of all OD origins, so no Dijkstra run is left to the
+first route queries of the main thread.
+"""
+import numpy as np
+
+
+class RoutingBuffer:
+
+    def __init__(self, network=None, lag=1, executor=None):
+
+        self.network = network
+        self.lag = lag  # time steps between the latency snapshot and the publication of its tables
+        self.executor = executor  # threads of the background computations
+        self.pending = None  # (publication step, future of the tables) of the tables being computed
+        self.num_published = 0
+
+        # origins of the demand, their rows are computed in the background in lazy routing mode
+        self.origins = np.unique(network.data.od_origin) if network.lazy_routing else None
+
+        # the network leaves its routing tables to the buffer
+        self.network.deferred_routing = True
+
+    def start(self, t):
+        """
+        Start the tables of the latency measured at time step t, called after the latency update of the network
+        """
+        # tables are published in order, the previous ones are due by now since the lag is at most an update interval
+        self.publish(t)
+
+        latency = self.network.routing_latency()
+        if not self.network.refresh_due(latency):
+            return None
+        if self.num_published == 0:
+            # there are no tables to route on yet
+            self._swap(self.network.compute_routing_tables(latency))
+        else:
+            self.pending = (t + self.lag, self.executor.submit(self.network.compute_routing_tables, latency,
+                                                              origins=self.origins))
+
+        return None
+
+    def publish(self, t):
+        # switch routing to the pending tables if they are due at time step t, waiting for them if needed
+        if self.pending is not None and t >= self.pending[0]:
+            tables = self.pending[1].result()
+            self.pending = None
+            self._swap(tables)
+        return None
+
+    def _swap(self, tables):
+        self.network.publish_routing_tables(tables)
+        self.num_published += 1
+        return None
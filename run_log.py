@@ -0,0 +1,79 @@
+"""
+Streaming log of the simulation progress
+
+Per-step counters are kept in memory, edge utilization rows are buffered and
+appended to the results store (and the utilization csv export) every flush_interval steps.
+The flow evolution plot is rendered once at the end of the run (or on demand).
+"""
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+
+
+class RunLog:
+
+    counters = ['t', 'new_cars_added', 'cars_in_transit', 'completed_trips']
+
+    def __init__(self, fname=None, flush_interval=60, store=None, export_csv=False):
+
+        self.fname = fname  # path prefix for the log files, nothing is written if None
+        self.flush_interval = flush_interval  # number of steps between writes of the utilization file
+        self.store = store  # ResultsWriter of the run, or None
+        self.export_csv = export_csv  # also write the utilization as csv
+
+        self.records = {c: [] for c in self.counters}  # per-step counters
+        self.utilization_buffer = []  # edge utilization rows not yet written to disk
+        self.num_steps = 0
+
+        # start a new utilization file
+        if self.fname is not None and self.export_csv:
+            open(self.utilization_path(), 'w').close()
+
+    def utilization_path(self):
+        return self.fname + "_array_utilization.csv"
+
+    def append(self, log_t):
+        for c in self.counters:
+            self.records[c].append(log_t[c])
+        self.utilization_buffer.append(log_t['edge_utilization'])
+        self.num_steps += 1
+
+        if len(self.utilization_buffer) >= self.flush_interval:
+            self.flush()
+
+        return None
+
+    def flush(self):
+        # append buffered edge utilization to disk
+        if len(self.utilization_buffer) > 0:
+            rows = np.vstack(self.utilization_buffer)
+            if self.store is not None:
+                self.store.append_utilization(rows)
+            if self.fname is not None and self.export_csv:
+                with open(self.utilization_path(), 'ab') as f:
+                    np.savetxt(f, rows, delimiter=",")
+        self.utilization_buffer = []
+        return None
+
+    def to_df(self):
+        return pd.DataFrame(self.records)
+
+    def plot(self):
+        # plot progress
+        if self.fname is None:
+            return None
+        self.to_df().plot(x='t', y=['new_cars_added', 'cars_in_transit', 'completed_trips'])
+        plt.xlabel('time step')
+        plt.ylabel('counts')
+        plt.savefig(self.fname + '_flow_evolution_log.png')
+        plt.close()
+        return None
+
+    def close(self, plot=True):
+        self.flush()
+        if self.store is not None:
+            self.store.close_utilization()
+            self.store.write_table('run_log', self.to_df())
+        if plot:
+            self.plot()
+        return None
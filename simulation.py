@@ -1,50 +1,186 @@
 """
 Define and run the simulation environment
+
+The routing policies of a simulation are stepped in lockstep and route the same cars of one demand stream.
+The first policy is the reference, routed with the exact latency (Network). The others are compared with it
+trip by trip, by default the DP policy (DPNetwork). More policies can be added with add_policy, e.g. other
+epsilon values or a router without traffic information (FreeFlowNetwork).
+
+The policies only share the demand of a step, so with parallel set the compared policies are advanced in child
+processes while the main process advances the reference, with a barrier at the end of every step (see
+policy_process.py). The random draws (demand and DP noise) are made by the main process in a fixed order, so the
+results do not depend on the mode.
+
+With a routing_lag, the routing tables of a latency update are computed in the background and published
+routing_lag seconds later (see routing_buffer.py), the cars keep moving and being routed in the meantime.
+With a refresh_threshold, the routing tables are only recomputed once the routing latency drifted by more than the
+threshold, or when they are older than max_staleness (see refresh_policy.py).
 """
-import matplotlib.pyplot as plt
+import hashlib
+import json
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+
 import numpy as np
 import pandas as pd
 from alive_progress import alive_bar
 
 
+from baseline import BaselineTrajectory
+from engine import EventEngine, SteppedEngine
 from network import Network
 from dp_network import DPNetwork
+from policy import RoutingPolicy
+from policy_process import PolicyProcesses
+from profiler import NullProfiler, StepProfiler
+from refresh_policy import RefreshPolicy
+from result_cache import lut_version, network_version
+from results_store import ResultsWriter
+from routing_buffer import RoutingBuffer
+from run_log import RunLog
 from traffic_generator import TrafficGenerator
+from trip_stats import TripStats
 
 
 class Simulation:
 
-    def __init__(self, demand_scenario=None, capacity_scenario=None, eps=0.01, fname=None):
+    def __init__(self, demand_scenario=None, capacity_scenario=None, eps=0.01, fname=None, lazy_routing=False,
+                 seed=1729, baseline_cache=None, engine='stepped', delta_t=10, multi_edge=False, city='SiouxFalls',
+                 incremental_routing=False):
+        self.city = city  # road network in Locations/<city>/
         self.demand_scenario = demand_scenario
         self.capacity_scenario = capacity_scenario
-        self.max_time = 360 * 2  # maximum number of time steps for the simulation
-        self.delta_t = 10  # time in seconds per simulation step
+        self.seed = seed
+        self.rng = np.random.RandomState(seed)  # random numbers for demand and DP noise of this simulation
+        self.delta_t = delta_t  # time in seconds per simulation step
+        self.max_time = int(2 * 3600 / self.delta_t)  # maximum number of time steps for the simulation (2 hours)
+        self.multi_edge = multi_edge  # carry the time left after an edge to the next edges within a step
         self.t = 0  # current time index of simulation
         self.counts_update_time = 120  # time intervals at which counts are updated
-        self.network = Network(capacity_scenario=capacity_scenario)  # road network with users
-        self.dp_network = DPNetwork(eps=eps, capacity_scenario=capacity_scenario)  # road network with DP routing
-        self.traffic_generator = TrafficGenerator(delta_t=self.delta_t, demand_scenario=demand_scenario)
+        self._update_interval()  # reject a delta_t that does not divide counts_update_time
+        self.routing_lag = 0  # delay (sec) between a count update and routing on its tables, multiple of delta_t
+        self.refresh_threshold = None  # relative latency drift that triggers a routing refresh, None for every update
+        self.max_staleness = 600  # maximum age (sec) of the routing tables when refresh_threshold is set
+        self.network = Network(capacity_scenario=capacity_scenario, lazy_routing=lazy_routing, city=city,
+                               incremental_routing=incremental_routing)  # road network with users
+        self.dp_network = DPNetwork(eps=eps, capacity_scenario=capacity_scenario, lazy_routing=lazy_routing,
+                                    rng=self.rng, city=city,
+                                    incremental_routing=incremental_routing)  # road network with DP routing
+        self.traffic_generator = TrafficGenerator(delta_t=self.delta_t, demand_scenario=demand_scenario,
+                                                  rng=self.rng, city=city)
         self.new_cars = None  # new cars generated for a time instant
-        self.cars = []  # list of current cars in the network
-        self.dp_cars = []  # list of current cars routed with DP
-        self.completed_trips = []  # list of cars whose trips are completed
-        self.dp_completed_trips = []  # list of cars with DP routing whose trips are completed
-        self.run_log = []  # log runtime results
+
+        # routing policies stepped in lockstep, the reference policy first
+        self.policies = [RoutingPolicy(name='network', network=self.network),
+                         RoutingPolicy(name='dp', network=self.dp_network)]
+        self.cars = self.policies[0].fleet  # current and completed cars in the network
+        self.dp_cars = self.policies[1].fleet  # current and completed cars routed with DP
+        self.run_log = None  # log runtime results
+        self.log_flush_interval = 60  # time steps between writes of the utilization log
+        self.plot_log = True  # plot the flow evolution at the end of the run
+        self.progress_bar = True  # show the progress bar while running
         self.fname = fname  # path for storing results and runtime progress
+        self.results = None  # ResultsWriter of the outputs (<fname>.npz)
+        self.export_csv = False  # also write the outputs as csv files
+        self.baseline_cache = baseline_cache  # folder for the non-private trajectory shared across eps, or None
+        self.engine = engine  # 'stepped' moves every car at every step, 'event' only processes edge exits
+        self.car_engine = None  # moves the cars of the non-DP network
+        self.dp_car_engine = None  # moves the cars of the DP network
+        self.profile = False  # record the time of each phase and counters of every step
+        self.profile_path = None  # csv file the profile is streamed to while profiling, or None
+        self.profiler = NullProfiler()  # per-step profile of the last run, a StepProfiler if profile is set
+        self.parallel = False  # advance the compared policies in child processes, with a barrier at every step
+        self.trip_stats = None  # metrics of the trips completed in both networks, paired as they complete
+
+    def add_policy(self, name, network):
+        """
+        Add a routing policy (network object, see policy.py) that routes the same cars as the other policies
+        Random policies should draw from self.rng to keep the run reproducible
+        """
+        if any(policy.name == name for policy in self.policies):
+            raise ValueError('A policy named %s already exists' % name)
+        self.policies.append(RoutingPolicy(name=name, network=network))
+        return None
+
+    def policy(self, name):
+        return next(policy for policy in self.policies if policy.name == name)
 
     def run(self):
 
         # Initializing run__log
-        self.run_log = []
+        self.run_log = self._new_run_log()
+
+        # Initializing the profiler, the non-DP and DP networks have a row per step
+        if self.profile:
+            self.profiler = StepProfiler(path=self.profile_path, flush_interval=self.log_flush_interval)
+        else:
+            self.profiler = NullProfiler()
+        profiler = self.profiler
+        profiled_networks = {policy.name: policy.network for policy in self.policies}
+        reference, compared = self.policies[0], self.policies[1:]
+
+        # Replay the non-private network if it was already simulated, otherwise record it
+        baseline, recorder = None, None
+        baseline_steps = 0
+        if self.baseline_cache is not None:
+            baseline_config = self.baseline_config()
+            baseline = BaselineTrajectory.load(self._baseline_path(baseline_config), config=baseline_config)
+            if baseline is None:
+                recorder = BaselineTrajectory()
+            else:
+                baseline_steps = baseline.num_steps
+                self.cars = reference.fleet = baseline.fleet
+
+        # Initializing the engines that move the cars
+        engine_class = EventEngine if self.engine == 'event' else SteppedEngine
+        update_interval = self._update_interval()
+        for policy in self.policies:
+            policy.engine = engine_class(network=policy.network, fleet=policy.fleet, delta_t=self.delta_t,
+                                         update_interval=update_interval, multi_edge=self.multi_edge)
+        self.car_engine = reference.engine
+
+        # Routing tables refreshed when the latency drifted, at least every max_staleness
+        for policy in self.policies:
+            policy.network.refresh_policy = None
+            if self.refresh_threshold is not None:
+                max_skipped = max(int(self.max_staleness / self.counts_update_time) - 1, 0)
+                policy.network.refresh_policy = RefreshPolicy(threshold=self.refresh_threshold, max_skipped=max_skipped,
+                                                              stats=policy.network.routing_stats)
+
+        # Background computation of the routing tables, published routing_lag after each count update
+        routing_lag = self._routing_lag(update_interval)
+        if routing_lag > 0:
+            routing = ThreadPoolExecutor(max_workers=len(self.policies), thread_name_prefix='routing')
+        else:
+            routing = nullcontext()
+        for policy in self.policies:
+            policy.network.deferred_routing = False  # set again by the buffer of a run with a routing lag
+            policy.routing = RoutingBuffer(network=policy.network, lag=routing_lag,
+                                           executor=routing) if routing_lag > 0 else None
+
+        # Completed trips are paired with the reference trips and released from the fleets at every step
+        replayed_trips = reference.fleet.drain_completed()
+        for policy in compared:
+            policy.trip_stats = TripStats(fleet=reference.fleet, dp_fleet=policy.fleet, trip_time=self._trip_time)
+            policy.trip_stats.add(trips=replayed_trips)
+        self.trip_stats = self.policies[1].trip_stats
 
         # Looping through every time step for the simulation
         t = 0
 
+        # Child processes of the compared policies, one per policy, forked before any thread of the run starts
+        if self.parallel:
+            workers = PolicyProcesses(simulation=self, policies=compared)
+        else:
+            workers = nullcontext()
+        self.dp_car_engine = self.policies[1].engine
+
         # Initializing progress bar
-        with alive_bar(self.max_time) as bar:
+        with routing, workers, alive_bar(self.max_time, disable=not self.progress_bar) as bar:
 
             # Run simulation for max_time and then wait till all cars reach destination
-            while t < self.max_time or len(self.cars) > 0 or len(self.dp_cars) > 0:
+            while (t < self.max_time or any(policy.engine.num_in_transit() > 0 for policy in self.policies)
+                   or t < baseline_steps):
 
                 # Progress update of the simulation
                 if t < self.max_time:
@@ -52,92 +188,200 @@ class Simulation:
                 elif t == self.max_time:
                     print('[Simulation] Cool off period begins')
 
-                if t % int(self.counts_update_time / self.delta_t) == 0:
-                    self.network.update_latency(self.cars)  # update latency as a function of active cars
-                    self.dp_network.update_latency(self.dp_cars)  # update latency for DP network
+                profiler.begin(t, profiled_networks)
 
-                # generate demand that can be sent to the DP and non-DP network
+                # the noise of the DP latency updates is drawn before the demand, in the order of the policies
+                update = t % update_interval == 0
+                if update:
+                    for policy in compared:
+                        policy.draw_noise()
+
+                # generate demand that can be sent to every policy
                 if t < self.max_time:
                     # only generate demand for max_time
                     new_demand = self.traffic_generator.new_demand()
                 else:
                     # after max_time, new demand = 0
-                    new_demand = 0 * self.traffic_generator.new_demand()
+                    new_demand = self.traffic_generator.no_demand()
+                profiler.lap(reference.name, 'demand')  # the demand is shared, its time is accounted to the reference
+
+                # the compared policies only read the demand, they run while the reference is advanced
+                if self.parallel:
+                    workers.submit(t, new_demand, self.traffic_generator.demand_first_id, update)
 
                 """
                 Routing for the non-DP network
                 """
-                new_cars = self.traffic_generator.new_cars(start_time=t, network=self.network, new_traffic=new_demand)
-                self.cars.extend(new_cars)  # draw new demand for this time step
-
-                # update location for each car depending on current network state
-                for car in self.cars:
-                    car.update_location(network=self.network, delta_t=self.delta_t)
-
-                # remove completed trips from active car list
-                just_completed = [car for car in self.cars if car.completed_trip is True]
-                self.cars = [car for car in self.cars if car.completed_trip is False]
-                self.completed_trips.extend(just_completed)
+                if update and t >= baseline_steps:
+                    reference.update_latency(t)  # update latency as a function of active cars
+                    profiler.lap(reference.name, 'latency_update')
+
+                if t < baseline_steps:
+                    log_t = baseline.log(t)
+                    self.network.edge_utilization = log_t['edge_utilization']
+                    if log_t['new_cars_added'] != int(new_demand.sum()):
+                        raise ValueError('The demand at t=%d differs from the replayed trajectory %s'
+                                         % (t, self._baseline_path(baseline_config)))
+                elif baseline is not None:
+                    # the replayed trajectory ends with no car in transit after max_time, there is nothing to move
+                    log_t = {'t': t, 'new_cars_added': 0, 'cars_in_transit': 0, 'completed_trips': 0,
+                             'edge_utilization': self.network.edge_utilization}
+                else:
+                    log_t = self._step_network(t, new_demand)
 
-                # Log and update status
-                log_t = {'t': t,
-                         'new_cars_added': len(new_cars),
-                         'cars_in_transit': len(self.cars),
-                         'completed_trips': len(just_completed),
-                         'edge_utilization': self.network.edge_utilization}
+                if recorder is not None:
+                    recorder.append(log_t)
+                    if t + 1 >= self.max_time and self.car_engine.num_in_transit() == 0 and recorder.num_steps is None:
+                        recorder.num_steps = t + 1
 
                 self._update_run_log(log_t)
+                profiler.lap(reference.name, 'log')
 
                 """
-                Routing in the DP network
+                Routing in the DP network and the other compared policies
                 """
-                new_cars = self.traffic_generator.new_cars(start_time=t,
-                                                           network=self.dp_network,
-                                                           new_traffic=new_demand)
-                self.dp_cars.extend(new_cars)  # draw new demand for this time step
-
-                # update location for each car depending on current network state
-                for car in self.dp_cars:
-                    car.update_location(network=self.dp_network, delta_t=self.delta_t)
+                if self.parallel:
+                    workers.results(profiler)  # barrier, errors of the children are raised here
+                    profiler.lap(reference.name, 'barrier')
+                else:
+                    for policy in compared:
+                        self._advance_policy(t, new_demand, policy, update)
 
-                # remove completed trips from active car list
-                just_completed = [car for car in self.dp_cars if car.completed_trip is True]
-                self.dp_cars = [car for car in self.dp_cars if car.completed_trip is False]
-                self.dp_completed_trips.extend(just_completed)
+                self._collect_trips(recorder)
+                profiler.lap(reference.name, 'trip_stats')
+                profiler.end()
 
                 # increment time counter
                 t += 1
 
-        return None
+        if baseline is not None and baseline.cars_generated != self.traffic_generator.cars_generated:
+            raise ValueError('%d cars were generated, the replayed trajectory has %d'
+                             % (self.traffic_generator.cars_generated, baseline.cars_generated))
+        for policy in self.policies:
+            policy.engine.finish()
+        self._collect_trips(recorder)
 
-    def _update_run_log(self, log_t):
-        # update master log
-        self.run_log.append(log_t)
+        # write the remaining log and plot progress
+        self.run_log.close(plot=self.plot_log)
+        profiler.close()
+        if self.results is not None:
+            self.results.write_metadata(self.metadata(num_steps=t))
 
-        # create a dataframe
-        log_df = pd.DataFrame(self.run_log)
+        if recorder is not None:
+            recorder.save(self._baseline_path(baseline_config), fleet=reference.fleet, config=baseline_config,
+                          cars_generated=self.traffic_generator.cars_generated, num_steps=recorder.num_steps)
 
-        # plot progress
-        log_df.plot(x='t', y=['new_cars_added', 'cars_in_transit', 'completed_trips'])
-        plt.xlabel('time step')
-        plt.ylabel('counts')
-        plt.savefig(self.fname + '_flow_evolution_log.png')
-        plt.close()
+        return None
 
-        # save edge utilization
-        edge_utilization_array = np.vstack(log_df['edge_utilization'].to_list())
-        np.savetxt(self.fname + "_array_utilization.csv", edge_utilization_array, delimiter=",")
+    def _new_run_log(self):
+        # results store and run log of a new run
+        self.results = ResultsWriter(self.fname + '.npz') if self.fname is not None else None
+        return RunLog(fname=self.fname, flush_interval=self.log_flush_interval, store=self.results,
+                      export_csv=self.export_csv)
+
+    def config(self):
+        # parameters that determine the results of a run
+        return {'city': self.city, 'demand_scenario': self.demand_scenario,
+                'capacity_scenario': self.capacity_scenario, 'eps': self.dp_network.epsilon, 'seed': self.seed,
+                'delta_t': self.delta_t, 'max_time': self.max_time, 'counts_update_time': self.counts_update_time,
+                'engine': self.engine, 'multi_edge': self.multi_edge, 'lazy_routing': self.network.lazy_routing,
+                'incremental_routing': self.network.incremental_routing, 'routing_lag': self.routing_lag,
+                'refresh_threshold': self.refresh_threshold,
+                'max_staleness': self.max_staleness if self.refresh_threshold is not None else None,
+                'policies': [policy.kind() for policy in self.policies]}
+
+    def baseline_config(self):
+        # parameters and input data that determine the trajectory of the non-private network, which is shared by
+        # the runs with other epsilon values. The routers of the policies are kept since the noise they draw from the
+        # shared rng shifts the demand
+        config = self.config()
+        del config['eps'], config['policies']
+        config['routers'] = [policy.kind()['router'] for policy in self.policies]
+        config.update({'network_version': network_version(self.city), 'lut_version': lut_version()})
+        return config
+
+    def _update_interval(self):
+        # time steps between count updates, the updates must fall on a time step
+        if self.counts_update_time % self.delta_t != 0:
+            raise ValueError('delta_t (%s s) must divide counts_update_time (%s s)'
+                             % (self.delta_t, self.counts_update_time))
+        return int(self.counts_update_time // self.delta_t)
+
+    def _routing_lag(self, update_interval):
+        # time steps between a count update and the publication of its routing tables, they must fall on a time step
+        if self.routing_lag % self.delta_t != 0:
+            raise ValueError('delta_t (%s s) must divide routing_lag (%s s)' % (self.delta_t, self.routing_lag))
+        routing_lag = int(self.routing_lag // self.delta_t)
+        if not 0 <= routing_lag <= update_interval:
+            raise ValueError('routing_lag must be between 0 and counts_update_time')
+        return routing_lag
+
+    def metadata(self, num_steps=None):
+        metadata = self.config()
+        metadata.update({'num_edges': self.network.num_edges, 'num_steps': num_steps,
+                         'routing_stats': {policy.name: policy.network.routing_stats for policy in self.policies}})
+        return metadata
+
+    def _advance_policy(self, t, new_demand, policy, update):
+        # update the latency of a compared policy at an update step and advance it, possibly in a child process
+        self.profiler.start()
+        if update:
+            policy.update_latency(t)  # update latency for DP network
+            self.profiler.lap(policy.name, 'latency_update')
+        return self._step_policy(t, new_demand, policy)
+
+    def _step_policy(self, t, new_demand, policy):
+        # route the new cars of the policy, move its cars and remove completed trips
+        policy.publish_routing(t)
+        new_cars = self.traffic_generator.new_cars(start_time=t, network=policy.network, new_traffic=new_demand)
+        self.profiler.lap(policy.name, 'spawn')
+
+        num_completed = policy.engine.step(t, new_cars)
+        self.profiler.lap(policy.name, 'move')
+
+        self.profiler.count(policy.name, 'cars_spawned', len(new_cars['car_id']))
+        self.profiler.count(policy.name, 'cars_moved', policy.engine.num_in_transit() + num_completed)
+        self.profiler.count(policy.name, 'completed_trips', num_completed)
+
+        return len(new_cars['car_id']), num_completed
+
+    def _step_network(self, t, new_demand):
+        num_new_cars, num_completed = self._step_policy(t, new_demand, self.policies[0])
+
+        # Log and update status
+        log_t = {'t': t,
+                 'new_cars_added': num_new_cars,
+                 'cars_in_transit': self.car_engine.num_in_transit(),
+                 'completed_trips': num_completed,
+                 'edge_utilization': self.network.edge_utilization}
+
+        return log_t
+
+    def _collect_trips(self, recorder=None):
+        # pair the trips completed since the last step, the non-DP trips are kept if the trajectory is recorded
+        trips = self.policies[0].fleet.drain_completed()
+        if recorder is not None:
+            recorder.add_trips(trips)
+        for policy in self.policies[1:]:
+            policy.trip_stats.add(trips=trips, dp_trips=policy.fleet.drain_completed())
+        return None
+
+    def _baseline_path(self, baseline_config):
+        # the hash of the config changes with any parameter or input data of the non-private network
+        key = hashlib.sha256(json.dumps(baseline_config, sort_keys=True).encode()).hexdigest()
+        return '%s/%s_%s_demand_%s_capacity_seed%s_%s.npz' % (
+            self.baseline_cache, self.city, self.demand_scenario, self.capacity_scenario, self.seed, key[:16])
+
+    def _update_run_log(self, log_t):
+        # update master log, the utilization log is written to disk every log_flush_interval steps
+        self.run_log.append(log_t)
 
     def _print_intermediate_stats(self):
-        print('No privacy:')
-        print('Cars in transit = ', len(self.cars))
-        print('Cars that completed trips = ', len(self.completed_trips))
         print('Total = ', self.traffic_generator.cars_generated)
-
-        print('With privacy:')
-        print('Cars in transit = ', len(self.dp_cars))
-        print('Cars that completed trips = ', len(self.dp_completed_trips))
-        print('Total = ', self.traffic_generator.dp_cars_generated)
+        for policy in self.policies:
+            print('Policy %s:' % policy.name)
+            print('Cars in transit = ', len(policy.fleet))
+            print('Cars that completed trips = ', policy.fleet.num_completed())
         return None
 
     def _compute_car_stats_df(self):
@@ -147,61 +391,70 @@ class Simulation:
             - For a vehicle, difference in trip time between private and non-private version
             - Total trip time for vehicles
             - Fraction of vehicles that are assigned the same route
+        The trips of both networks are paired by car id during the run, see TripStats
         """
 
+        return self.trip_stats.to_df()
+
+    def policy_summary_df(self):
         """
-        Efficiently store information in a dictionary with id = car.id
+        Summary statistics of each compared policy against the reference policy, one row per policy
         """
-
-        stat = {}
-
-        completed_car_id = {car.id for car in self.completed_trips}
-        dp_completed_car_id = {car.id for car in self.dp_completed_trips}
-
-        common_id = completed_car_id.intersection(dp_completed_car_id)
-
-        for car in self.completed_trips:
-            if car.id in common_id:
-                stat[car.id] = {'path': car.path,
-                                'tt': (car.finish_time - car.start_time) * self.delta_t,
-                                'est_tt': car.estimated_trip_time}
-
-        for car in self.dp_completed_trips:
-            if car.id in common_id:
-                stat[car.id]['dp_path'] = car.path
-                stat[car.id]['dp_tt'] = (car.finish_time - car.start_time) * self.delta_t
-                stat[car.id]['dp_est_tt'] = car.estimated_trip_time
-
-        # Compute performance metrics
-        stat_df = pd.DataFrame(stat.values())
-        stat_df['dp_induced_excess_tt'] = stat_df['dp_tt'] - stat_df['tt']
-        stat_df['path_similarity'] = stat_df.apply(
-            lambda x: len(set(x.path).intersection(x.dp_path)) * 2 / (len(x.path) + len(x.dp_path)), axis=1)
-        stat_df['tt_est_error'] = stat_df['tt'] - stat_df['est_tt']
-        stat_df['dp_tt_est_error'] = stat_df['dp_tt'] - stat_df['dp_est_tt']
-
-        # retaining only relevant columns and saving the results
-        stat_df.drop(columns=['path', 'dp_path'], inplace=True)
-
-        return stat_df
+        rows = []
+        for policy in self.policies[1:]:
+            stat_df = policy.trip_stats.to_df()
+            tt, policy_tt = stat_df['tt'].mean(), stat_df['dp_tt'].mean()
+            row = policy.kind()
+            row.update({'eps': np.nan if row['eps'] is None else row['eps'],
+                        'num_trips': stat_df.shape[0],
+                        'tt': tt,
+                        'policy_tt': policy_tt,
+                        'excess_tt': stat_df['dp_induced_excess_tt'].mean(),
+                        'excess_tt_percent': 100 * (policy_tt - tt) / tt,
+                        'no_excess_tt_percent': 100 * (stat_df['dp_induced_excess_tt'] == 0).mean(),
+                        'same_route_percent': 100 * (stat_df['path_similarity'] == 1).mean(),
+                        'policy_tt_est_error': stat_df['dp_tt_est_error'].mean()})
+            rows.append(row)
+
+        return pd.DataFrame(rows)
+
+    def _trip_time(self, trips):
+        tt = (trips['finish_time'] - trips['start_time']) * self.delta_t
+        if self.multi_edge:
+            # fractional finish time within the last time step
+            tt = tt + trips['finish_offset'] * self.delta_t
+        return tt
+
+    def _save_table(self, name, suffix, df):
+        # write a table to the results store, and to <fname><suffix> as csv export
+        if self.results is None:
+            self.results = ResultsWriter(self.fname + '.npz')
+        self.results.write_table(name, df)
+        if self.export_csv:
+            df.to_csv(self.fname + suffix, index=False, sep=',')
+        return None
 
     def _save_capacity(self):
         capacity_df = pd.DataFrame({'capacity': self.network.edge_capacity_list()})
-        capacity_df.to_csv(self.fname + '_edgeflowcapacity.csv', index=False, sep=',')
+        self._save_table('capacity', '_edgeflowcapacity.csv', capacity_df)
 
     def _save_critical_counts(self):
         counts_df = pd.DataFrame({'counts': self.network.critical_counts_list()})
-        counts_df.to_csv(self.fname + '_critical_counts.csv', index=False, sep=',')
+        self._save_table('critical_counts', '_critical_counts.csv', counts_df)
 
     def _save_demand(self):
         demand_df = pd.DataFrame({'lambda': self.traffic_generator.poisson_parameters()})
-        demand_df.to_csv(self.fname + '_lambda.csv', index=False, sep=',')
+        self._save_table('lambda', '_lambda.csv', demand_df)
 
     def save_summary_stats(self):
 
-        # car specific stats
+        # car specific stats, the DP policy keeps the dp_ column names of the other policies
         stat_df = self._compute_car_stats_df()
-        stat_df.to_csv(self.fname + '.csv', index=False, sep=',')
+        self._save_table('car_stats', '.csv', stat_df)
+        for policy in self.policies[2:]:
+            self._save_table('car_stats_' + policy.name, '_' + policy.name + '.csv', policy.trip_stats.to_df())
+        if len(self.policies) > 2:
+            self._save_table('policies', '_policies.csv', self.policy_summary_df())
 
         self._save_capacity()
         self._save_demand()
@@ -0,0 +1,114 @@
+"""
+Run the grid of experiments (eps, demand scenario, capacity scenario) over a pool of worker processes
+
+Every cell of the grid is an independent Simulation with its own random number generator.
+The seed of a cell is derived from the base seed and the demand and capacity scenarios, so that
+results do not depend on which worker runs the cell or in which order.
+Epsilon is left out of the seed so that all privacy levels see the same demand.
+With a baseline cache, the non-private network is simulated once per (demand, capacity, seed)
+by the cells of the first epsilon and replayed by the cells of the other epsilon values.
+With a result cache, cells whose configuration and code did not change are restored instead of simulated,
+so an interrupted sweep resumes with the cells that did not complete.
+"""
+import os
+import zlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from result_cache import ResultCache
+from results_store import export_csv as export_run_csv, load_run
+from simulation import Simulation
+
+
+def cell_seed(seed, demand_scenario, capacity_scenario):
+    # crc32 is used instead of hash() since string hashing is randomized across processes
+    key = [seed, zlib.crc32(str(demand_scenario).encode()), zlib.crc32(str(capacity_scenario).encode())]
+    return int(np.random.SeedSequence(key).generate_state(1)[0])
+
+
+def result_name(eps, demand_scenario, capacity_scenario, results_dir='results'):
+    # results/eps<eps>/<demand>_demand, with a capacity suffix for non-baseline capacity scenarios
+    name = results_dir + '/eps' + str(eps) + '/' + demand_scenario + '_demand'
+    if capacity_scenario is not None:
+        name += '_' + capacity_scenario + '_capacity'
+    return name
+
+
+def run_cell(eps, demand_scenario, capacity_scenario=None, seed=1729, results_dir='results', baseline_cache=None,
+             city='SiouxFalls', export_csv=False, cache_dir=None):
+    name = result_name(eps, demand_scenario, capacity_scenario, results_dir=results_dir)
+
+    sim = Simulation(demand_scenario=demand_scenario, capacity_scenario=capacity_scenario, eps=eps, fname=name,
+                     seed=cell_seed(seed, demand_scenario, capacity_scenario),
+                     baseline_cache=baseline_cache, city=city)  # Initialize
+    sim.progress_bar = False
+
+    if cache_dir is None:
+        sim.export_csv = export_csv
+        sim.run()  # Run simulation
+        sim.save_summary_stats()  # Save results
+        return name
+
+    # run in a new cache entry unless the same configuration was already computed
+    cache = ResultCache(cache_dir)
+    key = cache.key(sim.config())
+    if not cache.contains(key):
+        sim.fname = cache.new_entry(key)
+        sim.run()
+        sim.save_summary_stats()
+        cache.commit(key, sim.fname, sim.config())
+
+    cache.restore(key, name)
+    if export_csv:
+        results = load_run(name)
+        export_run_csv(results, name)
+        results.close()
+
+    return name
+
+
+def run_sweep(eps_values=None, demand_scenarios=None, capacity_scenarios=(None,), num_workers=None, seed=1729,
+              results_dir='results', baseline_cache=None, city='SiouxFalls', export_csv=False, cache_dir=None):
+    """
+    Run every (eps, demand, capacity) cell and return the list of result names in grid order
+    num_workers=1 runs the cells serially in this process
+    With cache_dir, completed cells are kept in the result cache and the baseline cache defaults to the
+    folder of the current code version in the cache
+    """
+    cells = [(eps, demand, capacity)
+             for eps in eps_values for demand in demand_scenarios for capacity in capacity_scenarios]
+
+    for eps in eps_values:
+        os.makedirs(results_dir + '/eps' + str(eps), exist_ok=True)
+
+    if cache_dir is not None and baseline_cache is None:
+        baseline_cache = ResultCache(cache_dir).baseline_cache()
+
+    kwargs = {'seed': seed, 'results_dir': results_dir, 'baseline_cache': baseline_cache, 'city': city,
+              'export_csv': export_csv, 'cache_dir': cache_dir}
+
+    # the first epsilon computes the non-private baselines before the other cells replay them
+    if baseline_cache is None:
+        waves = [list(range(len(cells)))]
+    else:
+        waves = [[i for i, cell in enumerate(cells) if cell[0] == eps_values[0]],
+                 [i for i, cell in enumerate(cells) if cell[0] != eps_values[0]]]
+
+    names = [None] * len(cells)
+
+    if num_workers == 1:
+        for wave in waves:
+            for i in wave:
+                names[i] = run_cell(*cells[i], **kwargs)
+        return names
+
+    with ProcessPoolExecutor(max_workers=num_workers) as executor:
+        for wave in waves:
+            futures = {executor.submit(run_cell, *cells[i], **kwargs): i for i in wave}
+            for future in as_completed(futures):
+                i = futures[future]
+                names[i] = future.result()
+                print('[Sweep] finished eps = %s, %s demand, %s capacity' % cells[i])
+
+    return names
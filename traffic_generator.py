@@ -1,12 +1,10 @@
 import numpy as np
-import pandas as pd
-from car import Car
-from network import Network
+from network_data import load_network_data
 
 
 class TrafficGenerator:
 
-    def __init__(self, delta_t=None, demand_scenario=None):
+    def __init__(self, delta_t=None, demand_scenario=None, rng=None, city='SiouxFalls'):
 
         # time interval for computing poisson rate
         self.delta_t = delta_t
@@ -15,64 +13,76 @@ class TrafficGenerator:
         self.demand_scenario = demand_scenario
 
         # load data
-        self.city = 'SiouxFalls'
-        self.demand_df = pd.read_csv("Locations/" + self.city + "/od.csv")
+        self.city = city
+        data = load_network_data(self.city)
+
+        # OD pairs
+        self.origin = data.od_origin
+        self.destination = data.od_destination
+        self.num_od = self.origin.shape[0]
 
         # poisson arrival rate
         if self.demand_scenario == 'baseline' or self.demand_scenario is None:
-            self.demand_df['lambda'] = self.demand_df['volume'] / (24*60*60) * delta_t * 4
+            self.rate = data.od_volume / (24*60*60) * delta_t * 4
         if self.demand_scenario == 'low':
-            self.demand_df['lambda'] = self.demand_df['volume'] / (24*60*60) * delta_t * 2
+            self.rate = data.od_volume / (24*60*60) * delta_t * 2
         if self.demand_scenario == 'high':
-            self.demand_df['lambda'] = self.demand_df['volume'] / (24*60*60) * delta_t * 6
+            self.rate = data.od_volume / (24*60*60) * delta_t * 6
 
-        # track total cars that have been created
+        # track total cars that have been created, the cars of a demand draw get the same ids in every network
         self.cars_generated = 0
-        self.dp_cars_generated = 0
+        self.demand_first_id = 0  # id of the first car of the last demand draw
 
-        np.random.seed(1729)
+        # random number generator for the demand
+        self.rng = np.random.RandomState(1729) if rng is None else rng
 
     def new_demand(self):
         #  compute the demand for new OD traffic
-        demand = np.random.poisson(self.demand_df['lambda'])
+        demand = self.rng.poisson(self.rate)
+        self.demand_first_id = self.cars_generated
+        self.cars_generated += int(demand.sum())
         return demand
 
-    def new_cars(self, start_time=None, network=None, new_traffic=None):
+    def no_demand(self):
+        # zero demand for every OD pair, without sampling
+        self.demand_first_id = self.cars_generated
+        return np.zeros(self.num_od, dtype=np.int64)
 
-        if type(network) == Network:
-            is_dp = False
-        else:
-            is_dp = True
+    def new_cars(self, start_time=None, network=None, new_traffic=None):
+        """
+        Create all new cars of a time step in one batch
+        Return a dictionary of arrays that can be added to a Fleet
+        Cars with the same OD pair share the route computed for it
+        The ids of the cars are those of the last demand draw, so that every network gets the same cars
+        """
 
         if new_traffic is None:
-            new_traffic = np.random.poisson(self.demand_df['lambda'])  # number of new cars
-
-        new_cars = []  # create new car list
-
-        # create new cars for each of these OD pairs
-        for index in range(self.demand_df.shape[0]):
-
-            if new_traffic[index] > 0:
-
-                for _ in range(new_traffic[index]):
-                    origin = int(self.demand_df.iloc[index]['origin'])
-                    destination = int(self.demand_df.iloc[index]['destination'])
+            new_traffic = self.new_demand()  # number of new cars
 
-                    car = Car(car_id=self.dp_cars_generated if is_dp else self.cars_generated,
-                              origin=origin,
-                              destination=destination,
-                              edge_path=network.shortest_path(origin, destination),
-                              start_time=start_time,
-                              estimated_trip_time=network.estimate_travel_time(origin, destination))
+        # OD pairs with new cars
+        od_index = np.nonzero(new_traffic)[0]
+        counts = np.asarray(new_traffic)[od_index]
+        num_cars = int(counts.sum())
 
-                    if is_dp:
-                        self.dp_cars_generated += 1
-                    else:
-                        self.cars_generated += 1
+        # route once for each OD pair
+        routes = []
+        estimated_trip_time = np.zeros(od_index.shape[0])
+        for i, index in enumerate(od_index.tolist()):
+            route, estimated_trip_time[i] = network.route(int(self.origin[index]), int(self.destination[index]))
+            routes.append(route)
 
-                    new_cars.append(car)
-
-        return new_cars
+        # create new cars for each of these OD pairs
+        first_id = self.demand_first_id
+        route_index = np.repeat(np.arange(od_index.shape[0]), counts)
+        car_od = od_index[route_index]
+
+        return {'car_id': np.arange(first_id, first_id + num_cars),
+                'origin': self.origin[car_od],
+                'destination': self.destination[car_od],
+                'routes': routes,
+                'route_index': route_index,
+                'start_time': start_time,
+                'estimated_trip_time': estimated_trip_time[route_index]}
 
     def poisson_parameters(self):
-        return self.demand_df['lambda'].to_list()
+        return self.rate.tolist()
@@ -0,0 +1,130 @@
+"""
+Online pairing of the completed trips of the non-DP and DP networks
+
+Completed trips are added as they are removed from the fleets. A trip waits in the pending buffer of its network
+until the car with the same id completes its trip in the other network, the metrics of the pair are then computed
+and appended to columnar buffers. The memory of the pending buffers is bounded by the number of cars that completed
+in one network and are still in transit in the other one.
+Pairs are kept in the order of completion in the non-DP network, as in a merge of both completed trip tables.
+"""
+import numpy as np
+import pandas as pd
+
+
+def path_similarity(path, dp_path):
+    return len(set(path.tolist()).intersection(dp_path.tolist())) * 2 / (len(path) + len(dp_path))
+
+
+class TripStats:
+
+    pending_fields = ['id', 'order', 'tt', 'est_tt', 'path_offset', 'path_length']
+    columns = ['order', 'tt', 'est_tt', 'dp_tt', 'dp_est_tt', 'path_similarity']
+
+    def __init__(self, fleet=None, dp_fleet=None, trip_time=None):
+
+        self.fleets = [fleet, dp_fleet]  # fleets of the non-DP and DP network, for the path of the trips
+        self.trip_time = trip_time  # function of a trip table that returns the trip times
+
+        # trips waiting for the other network, sorted by id, for the non-DP and DP network
+        self.pending = [None, None]
+        self.num_trips = [0, 0]  # number of trips added for each network
+
+        self.chunks = []  # metrics of the paired trips
+        self.similarity = {}  # path similarity of the pairs of routes seen so far, key: route offsets and lengths
+
+    def add(self, trips=None, dp_trips=None):
+        """
+        Add lists of completed trip chunks (dictionaries of arrays as stored by Fleet) of both networks
+        """
+        for side, chunks in enumerate([trips, dp_trips]):
+            for chunk in chunks if chunks is not None else []:
+                self._add_chunk(side, chunk)
+        return None
+
+    def _add_chunk(self, side, chunk):
+        num_new = chunk['id'].shape[0]
+        if num_new == 0:
+            return None
+
+        new = {'id': chunk['id'],
+               'order': self.num_trips[side] + np.arange(num_new),
+               'tt': self.trip_time(chunk),
+               'est_tt': chunk['estimated_trip_time'],
+               'path_offset': chunk['path_offset'],
+               'path_length': chunk['path_length']}
+        self.num_trips[side] += num_new
+        for p in range(2):
+            if self.pending[p] is None:
+                self.pending[p] = {f: v[:0] for f, v in new.items()}
+
+        # match the new trips with the pending trips of the other network
+        other = self.pending[1 - side]
+        matched = np.zeros(num_new, dtype=bool)
+        if other['id'].shape[0] > 0:
+            position = np.minimum(np.searchsorted(other['id'], new['id']), other['id'].shape[0] - 1)
+            matched = other['id'][position] == new['id']
+
+        if np.any(matched):
+            other_matched = {f: v[position[matched]] for f, v in other.items()}
+            new_matched = {f: v[matched] for f, v in new.items()}
+            if side == 0:
+                self._append_pairs(new_matched, other_matched)
+            else:
+                self._append_pairs(other_matched, new_matched)
+            remaining = np.ones(other['id'].shape[0], dtype=bool)
+            remaining[position[matched]] = False
+            self.pending[1 - side] = {f: v[remaining] for f, v in other.items()}
+
+        # the unmatched trips wait for the other network
+        if not np.all(matched):
+            pending = self.pending[side]
+            merged = {f: np.concatenate([pending[f], new[f][~matched]]) for f in self.pending_fields}
+            index = np.argsort(merged['id'], kind='stable')
+            self.pending[side] = {f: v[index] for f, v in merged.items()}
+
+        return None
+
+    def _path_similarity(self, route_pair):
+        # path similarity, computed once for each distinct pair of routes
+        value = self.similarity.get(route_pair)
+        if value is None:
+            o, n, dp_o, dp_n = route_pair
+            value = path_similarity(self.fleets[0].path(o, n), self.fleets[1].path(dp_o, dp_n))
+            self.similarity[route_pair] = value
+        return value
+
+    def _append_pairs(self, trips, dp_trips):
+        route_pairs = zip(trips['path_offset'].tolist(), trips['path_length'].tolist(),
+                          dp_trips['path_offset'].tolist(), dp_trips['path_length'].tolist())
+        similarity = np.fromiter(map(self._path_similarity, route_pairs), dtype=float, count=trips['id'].shape[0])
+
+        self.chunks.append({'order': trips['order'],
+                            'tt': trips['tt'],
+                            'est_tt': trips['est_tt'],
+                            'dp_tt': dp_trips['tt'],
+                            'dp_est_tt': dp_trips['est_tt'],
+                            'path_similarity': similarity})
+        return None
+
+    def num_pending(self):
+        return sum(p['id'].shape[0] for p in self.pending if p is not None)
+
+    def to_df(self):
+        """
+        Metrics of the paired trips, in order of completion in the non-DP network
+        """
+        if len(self.chunks) > 1:
+            self.chunks = [{c: np.concatenate([chunk[c] for chunk in self.chunks]) for c in self.columns}]
+        if len(self.chunks) == 0:
+            pairs = {c: np.zeros(0) for c in self.columns}
+        else:
+            pairs = self.chunks[0]
+        index = np.argsort(pairs['order'], kind='stable')
+
+        stat_df = pd.DataFrame({c: pairs[c][index] for c in ['tt', 'est_tt', 'dp_tt', 'dp_est_tt']})
+        stat_df['dp_induced_excess_tt'] = stat_df['dp_tt'] - stat_df['tt']
+        stat_df['path_similarity'] = pairs['path_similarity'][index]
+        stat_df['tt_est_error'] = stat_df['tt'] - stat_df['est_tt']
+        stat_df['dp_tt_est_error'] = stat_df['dp_tt'] - stat_df['dp_est_tt']
+
+        return stat_df